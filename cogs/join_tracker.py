@@ -1,58 +1,194 @@
 import discord
 from discord.ext import commands
 from datetime import datetime
+import asyncio
+import logging
 import pytz
 
+from utils.announce_batcher import AnnouncementBatcher
+
+logger = logging.getLogger(__name__)
+
+
+class _Ref:
+    """メンション表記だけを持つ参照（スナップショットから復元した招待の作成者・チャンネル用）"""
+    __slots__ = ("id", "mention")
+
+    def __init__(self, id, mention):
+        self.id = id
+        self.mention = mention
+
+
+class CachedInvite:
+    """スナップショットから復元した招待（招待元の判定と通知に使う属性のみ）"""
+    __slots__ = ("code", "uses", "max_uses", "inviter", "channel")
+
+    def __init__(self, code, uses, max_uses, inviter_id, channel_id):
+        self.code = code
+        self.uses = uses
+        self.max_uses = max_uses
+        self.inviter = _Ref(inviter_id, f"<@{inviter_id}>") if inviter_id else None
+        self.channel = _Ref(channel_id, f"<#{channel_id}>" if channel_id else "不明")
+
+
 class JoinTracker(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.stb_blue = 0x4285F4
         self.invites = {}  # 招待リンクのキャッシュ {guild_id: {code: invite}}
 
-    @commands.Cog.listener()
-    async def on_ready(self):
-        """起動時に既存の招待リンクの情報をキャッシュします"""
-        for guild in self.bot.guilds:
+        # 参加バースト対策：窓内の参加者をまとめて1回の招待リスト取得で判定する
+        self.join_window = 2.0
+        self._pending = {}   # {guild_id: [member, ...]}
+        self._vanished = {}  # 窓内に削除された招待 {guild_id: {code: invite}}（上限到達で消えた招待の判定用）
+        self._carry = {}     # 前回の取得で余った使用回数 {guild_id: [invite, ...]}
+        self._tasks = {}
+        self._refresh_limit = asyncio.Semaphore(4)
+
+        self.joins = bot.metrics.counter("member_joins_total", "Members joined")
+
+        # 参加通知は最大10件を1メッセージにまとめ、大量参加時は一覧表示に切り替える
+        self.batcher = AnnouncementBatcher(self._build_summary, flush_delay=1.0, max_embeds=10, summary_threshold=30)
+
+    async def cog_load(self):
+        # 再起動直後から招待元を判定できるよう、前回の招待キャッシュを接続前に復元する
+        self.bot.snapshots.register("join_tracker_invites", self._dump_invites, self._restore_invites, max_age=6 * 3600)
+
+    async def cog_unload(self):
+        self.bot.snapshots.unregister("join_tracker_invites")
+
+    def _dump_invites(self):
+        return {
+            str(guild_id): [
+                [i.code, i.uses or 0, i.max_uses or 0, i.inviter.id if i.inviter else None, i.channel.id if i.channel else None]
+                for i in invites.values()
+            ]
+            for guild_id, invites in self.invites.items()
+        }
+
+    def _restore_invites(self, data):
+        for guild_id, rows in data.items():
+            self.invites.setdefault(int(guild_id), {code: CachedInvite(code, *rest) for code, *rest in rows})
+
+    async def _refresh_guild(self, guild):
+        async with self._refresh_limit:
             try:
                 self.invites[guild.id] = {invite.code: invite for invite in await guild.invites()}
-            except discord.Forbidden:
-                pass
+            except discord.HTTPException:
+                self.invites.pop(guild.id, None)
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        """起動時に既存の招待リンクの情報を並列（同時実行数制限付き）でキャッシュします"""
+        # 復元したキャッシュのうち、既に参加していないサーバーの分は破棄
+        current = {guild.id for guild in self.bot.guilds}
+        for guild_id in [gid for gid in self.invites if gid not in current]:
+            del self.invites[guild_id]
+        await asyncio.gather(*(self._refresh_guild(guild) for guild in self.bot.guilds))
 
     @commands.Cog.listener()
     async def on_guild_join(self, guild):
         """ボットが新しいサーバーに参加した際にキャッシュを更新します"""
-        try:
-            self.invites[guild.id] = {invite.code: invite for invite in await guild.invites()}
-        except discord.Forbidden:
-            pass
+        await self._refresh_guild(guild)
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild):
+        for cache in (self.invites, self._pending, self._vanished, self._carry):
+            cache.pop(guild.id, None)
+
+    @commands.Cog.listener()
+    async def on_invite_create(self, invite):
+        """招待リンク作成イベントでキャッシュを差分更新します"""
+        if invite.guild is not None and invite.guild.id in self.invites:
+            self.invites[invite.guild.id][invite.code] = invite
+
+    @commands.Cog.listener()
+    async def on_invite_delete(self, invite):
+        """招待リンク削除イベントでキャッシュを差分更新します"""
+        if invite.guild is None:
+            return
+        cached = self.invites.get(invite.guild.id, {}).pop(invite.code, None)
+        # 使用回数上限で消えた招待は前後の参加者の招待元になり得るため、次の判定まで保持する
+        if cached is not None and cached.max_uses:
+            vanished = self._vanished.setdefault(invite.guild.id, {})
+            vanished[invite.code] = cached
+            if len(vanished) > 50:
+                del vanished[next(iter(vanished))]
 
     @commands.Cog.listener()
     async def on_member_join(self, member):
-        """メンバー参加時に招待元を特定し、詳細情報を出力します"""
+        """メンバー参加を窓単位でまとめ、招待元の特定を1回の取得で行います"""
         guild = member.guild
-        system_channel = guild.system_channel
+        self.joins.inc()
         
         # システムチャンネルが設定されていない場合は処理を中断
-        if not system_channel:
+        if not guild.system_channel:
             return
 
-        # 招待リンクを特定
-        invites_before = self.invites.get(guild.id, {})
-        invites_after = {}
+        self._pending.setdefault(guild.id, []).append(member)
+        if guild.id not in self._tasks:
+            self._tasks[guild.id] = asyncio.create_task(self._process_joins(guild))
+
+    async def _process_joins(self, guild):
         try:
-            invites_after = {invite.code: invite for invite in await guild.invites()}
-        except discord.Forbidden:
-            return # 招待リンク取得権限がない場合
-
-        # どのリンクの使用回数が増えたかを探す
-        used_invite = None
-        for code, invite in invites_after.items():
-            if code in invites_before and invite.uses > invites_before[code].uses:
-                used_invite = invite
-                break
-        
-        # キャッシュを更新
-        self.invites[guild.id] = invites_after
+            await asyncio.sleep(self.join_window)
+            members = self._pending.pop(guild.id, [])
+            vanished = self._vanished.pop(guild.id, {})
+            if not members:
+                return
+
+            # 招待リンクを特定（窓内の参加者全員分を1回の取得で判定）
+            known = guild.id in self.invites
+            invites_before = {**vanished, **self.invites.get(guild.id, {})}
+            try:
+                invites_after = {invite.code: invite for invite in await guild.invites()}
+            except discord.HTTPException as e:
+                # 権限不足・APIエラー時は招待元不明として参加者を案内する（キャッシュは次回の取得まで維持）
+                logger.warning("Invite lookup for guild %s failed: %s", guild.id, e)
+                for member in members:
+                    self._announce(member, None)
+                return
+            
+            # どのリンクの使用回数がいくつ増えたかを探す
+            used = list(self._carry.pop(guild.id, []))
+            for code, invite in invites_after.items():
+                before = invites_before.get(code)
+                if before is not None:
+                    delta = invite.uses - before.uses
+                else:
+                    # キャッシュに無い招待は、作成イベントを取りこぼした新規招待とみなせる場合のみ数える
+                    delta = invite.uses if known and invite.uses <= len(members) else 0
+                used.extend([invite] * max(delta, 0))
+            for code, invite in vanished.items():
+                remaining = invite.max_uses - invite.uses
+                # 期限切れ・手動削除と区別するため、残り回数が参加者数以内の場合のみ上限到達とみなす
+                if code not in invites_after and 0 < remaining <= len(members):
+                    used.extend([invite] * remaining)
+
+            # キャッシュを更新
+            self.invites[guild.id] = invites_after
+
+            # 参加順に割り当て、余った使用回数は次の窓へ持ち越す
+            attributed = used[:len(members)]
+            if len(used) > len(members):
+                self._carry[guild.id] = used[len(members):len(members) + 10]
+            attributed += [None] * (len(members) - len(attributed))
+
+            for member, used_invite in zip(members, attributed):
+                self._announce(member, used_invite)
+        except Exception as e:
+            logger.error("Join processing for guild %s failed: %s", guild.id, e, exc_info=True)
+        finally:
+            self._tasks.pop(guild.id, None)
+            # 処理中に参加したメンバーがいれば次の窓を開始する
+            if self._pending.get(guild.id):
+                self._tasks[guild.id] = asyncio.create_task(self._process_joins(guild))
+
+    def _announce(self, member, used_invite):
+        """参加メンバーの詳細情報を出力します"""
+        system_channel = member.guild.system_channel
+        if not system_channel:
+            return
 
         # 情報の解析
         now = datetime.now(pytz.utc)
@@ -97,7 +233,19 @@ class JoinTracker(commands.Cog):
 
         embed.set_footer(text="Rb m/26S Security Protocol • 瑞典技術設計局")
 
-        await system_channel.send(embed=embed)
+        line = f"{member.mention} • " + (f"`{used_invite.code}`" if used_invite else "招待元不明")
+        self.batcher.submit(system_channel, embed, line)
+
+    def _build_summary(self, lines):
+        """大量参加時のコンパクトな参加者一覧"""
+        embed = discord.Embed(
+            title=f"New Members Joined ({len(lines)})",
+            description="\n".join(lines),
+            color=self.stb_blue,
+            timestamp=datetime.now()
+        )
+        embed.set_footer(text="Rb m/26S Security Protocol • 瑞典技術設計局")
+        return embed
 
 async def setup(bot):
     await bot.add_cog(JoinTracker(bot))
@@ -0,0 +1,139 @@
+import discord
+from discord import app_commands
+from discord.ext import commands
+import asyncio
+import math
+import os
+import resource
+from datetime import datetime
+
+
+def _since_created(interaction: discord.Interaction):
+    """インタラクション発行からの経過秒数（時計のずれで負になる場合は0）"""
+    return max((discord.utils.utcnow() - interaction.created_at).total_seconds(), 0.0)
+
+
+def _resident_bytes():
+    """プロセスの常駐メモリ（Linuxは現在値、それ以外はピーク値）"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _ms(seconds):
+    return "-" if seconds is None else f"{seconds * 1000:.0f}"
+
+
+class Metrics(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+        self.sweden_blue = 0x005B99
+        registry = bot.metrics
+
+        self.command_latency = registry.histogram(
+            "app_command_seconds", "Time from interaction creation to command completion", ("command", "outcome"))
+        self.dispatch_latency = registry.histogram(
+            "interaction_dispatch_seconds", "Time from interaction creation to receipt by the bot", ("type",))
+        self.heartbeat = registry.histogram(
+            "gateway_heartbeat_seconds", "Gateway heartbeat round trip (sampled)")
+        registry.gauge("gateway_latency_seconds", "Latest gateway heartbeat round trip", lambda: bot.latency)
+        registry.gauge("guilds", "Guilds the bot is in", lambda: len(bot.guilds))
+        registry.gauge("process_resident_bytes", "Resident set size of the bot process", _resident_bytes)
+        registry.gauge("cached_members", "Members held by the library member cache", lambda: sum(len(g.members) for g in bot.guilds))
+        registry.gauge("recent_members", "Members held by the recent-member LRU", lambda: len(bot.recent_members))
+
+        self._sampler = None
+        self._original_tree_error = None
+
+    async def cog_load(self):
+        # 失敗したコマンドも計測するため、ツリーのエラーハンドラを差し替える（既定の処理は維持）
+        self._original_tree_error = self.bot.tree.on_error
+        self.bot.tree.on_error = self.on_app_command_error
+        self._sampler = asyncio.create_task(self._sample_heartbeat())
+
+        port = os.getenv("METRICS_PORT")
+        if port:
+            await self.bot.metrics.start_server(os.getenv("METRICS_HOST", "127.0.0.1"), int(port))
+
+    async def cog_unload(self):
+        self.bot.tree.on_error = self._original_tree_error
+        if self._sampler is not None:
+            self._sampler.cancel()
+        await self.bot.metrics.stop_server()
+
+    async def _sample_heartbeat(self, interval=30.0):
+        child = self.heartbeat.labels()
+        while True:
+            await asyncio.sleep(interval)
+            latency = self.bot.latency
+            if math.isfinite(latency):
+                child.observe(latency)
+
+    # --- 計測フック ---
+    @commands.Cog.listener()
+    async def on_interaction(self, interaction: discord.Interaction):
+        self.dispatch_latency.labels(interaction.type.name).observe(_since_created(interaction))
+
+    @commands.Cog.listener()
+    async def on_app_command_completion(self, interaction: discord.Interaction, command):
+        self.command_latency.labels(command.qualified_name, "ok").observe(_since_created(interaction))
+
+    async def on_app_command_error(self, interaction: discord.Interaction, error: app_commands.AppCommandError):
+        name = interaction.command.qualified_name if interaction.command else "unknown"
+        self.command_latency.labels(name, "error").observe(_since_created(interaction))
+        await self._original_tree_error(interaction, error)
+
+    # --- 管理用サマリー ---
+    def _histogram_lines(self, histogram, limit=10):
+        rows = sorted(histogram.series(), key=lambda item: item[1].count, reverse=True)[:limit]
+        lines = []
+        for values, child in rows:
+            if not child.count:
+                continue
+            label = "/".join(values) or "all"
+            lines.append(f"{label:<28} n={child.count:<6} p50={_ms(child.quantile(0.5)):>5}ms p99={_ms(child.quantile(0.99)):>5}ms")
+        return "\n".join(lines) or "No data"
+
+    @app_commands.command(name="metrics", description="【運営専用】ボット内部のメトリクス概要を表示します。")
+    @app_commands.checks.has_permissions(administrator=True)
+    async def metrics(self, interaction: discord.Interaction):
+        """管理用：コマンド・HTTP・イベント・ゲートウェイの計測値を表示"""
+        registry = self.bot.metrics
+        embed = discord.Embed(title="📈 System Metrics", color=self.sweden_blue, timestamp=datetime.now())
+
+        embed.add_field(name="APP COMMANDS", value=f"```\n{self._histogram_lines(self.command_latency)}\n```", inline=False)
+        http = registry.get("http_request_seconds")
+        if http is not None:
+            embed.add_field(name="HTTP (Gist / RSS)", value=f"```\n{self._histogram_lines(http)}\n```", inline=False)
+        embed.add_field(name="INTERACTION DISPATCH", value=f"```\n{self._histogram_lines(self.dispatch_latency)}\n```", inline=False)
+
+        events = []
+        for name in ("member_joins_total", "ticket_events_total"):
+            counter = registry.get(name)
+            if counter is not None:
+                for values, child in counter.series():
+                    events.append(f"{name}{'/' + '/'.join(values) if values else ''}: {child.value}")
+        embed.add_field(name="EVENTS", value=f"```\n{chr(10).join(events) or 'No data'}\n```", inline=False)
+
+        # ギルド別のメンバー保持数（ライブラリキャッシュ / 最近のメンバーLRU）と常駐メモリ
+        recent = self.bot.recent_members.per_guild()
+        guilds = sorted(self.bot.guilds, key=lambda g: len(g.members) + recent.get(g.id, 0), reverse=True)[:10]
+        memory = [f"RSS {_resident_bytes() / 1048576:.1f} MiB | policy: {'lean' if self.bot.lean_member_cache else 'full'}"]
+        memory += [f"{g.name[:20]:<20} cache={len(g.members):<6} lru={recent.get(g.id, 0)}" for g in guilds]
+        embed.add_field(name="MEMORY", value=f"```\n{chr(10).join(memory)}\n```", inline=False)
+
+        beat = self.heartbeat.labels()
+        embed.add_field(
+            name="GATEWAY HEARTBEAT",
+            value=f"```\nnow={_ms(self.bot.latency)}ms p50={_ms(beat.quantile(0.5))}ms p99={_ms(beat.quantile(0.99))}ms\n```",
+            inline=False
+        )
+
+        embed.set_footer(text="Rb m/26S Strategic System | 瑞典技術設計局")
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+
+async def setup(bot):
+    await bot.add_cog(Metrics(bot))
@@ -70,6 +70,16 @@ class Ping(commands.Cog):
             inline=True
         )
 
+        # イベントループの遅延（直近数分のp50 / p99）
+        watchdog = self.bot.watchdog
+        p50, p99 = watchdog.percentile(0.5), watchdog.percentile(0.99)
+        loop_lag = f"{p50 * 1000:.1f} / {p99 * 1000:.1f} ms" if p50 is not None else "計測中"
+        report_embed.add_field(
+            name="🧭 Loop Lag (p50 / p99)", 
+            value=f"```\n{loop_lag}\n```", 
+            inline=True
+        )
+
         # ブランドの一貫性を保つフッター
         report_embed.set_footer(
             text="Rb m/26S Strategic System | 瑞典技術設計局",
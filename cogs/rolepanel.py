@@ -1,18 +1,118 @@
 import discord
 from discord import app_commands
 from discord.ext import commands
+import re
+
+from utils.role_queue import RoleMutationQueue
+
+# パネル1枚あたりのロール上限（ボタン 5行×5個 / セレクトメニューの選択肢数）
+MAX_PANEL_ROLES = 25
+ROLE_MENTION_PATTERN = re.compile(r'<@&(\d+)>|\b(\d{15,21})\b')
+
+
+def _role_queue(interaction: discord.Interaction) -> RoleMutationQueue:
+    return interaction.client.get_cog("RolePanel").role_queue
+
+
+def _assign_error(role: discord.Role):
+    """ボットがロールを付与 / 解除できない理由（可能なら None）。キュー投入前に判定し、成功と誤って応答しない"""
+    if not role.guild.me.guild_permissions.manage_roles:
+        return "エラー: ボットに「ロールの管理」権限がありません。"
+    if not role.is_assignable():
+        return f"エラー: **{role.name}** はボットより上位、または管理対象外のため変更できません。"
+    return None
+
+
+async def toggle_member_role(interaction: discord.Interaction, role_id: int):
+    """ロールの付与 / 解除を切り替える（変更はキューでまとめて反映し、応答は即時に返す）"""
+    role = interaction.guild.get_role(role_id)
+
+    if not role:
+        return await interaction.response.send_message("エラー: ロールが見つかりません。", ephemeral=True)
+    error = _assign_error(role)
+    if error:
+        return await interaction.response.send_message(error, ephemeral=True)
+
+    queue = _role_queue(interaction)
+    if queue.has_role(interaction.user, role.id):
+        queue.submit(interaction.user, {role.id: False})
+        await interaction.response.send_message(f"**{role.name}** を解除しました。", ephemeral=True)
+    else:
+        queue.submit(interaction.user, {role.id: True})
+        await interaction.response.send_message(f"**{role.name}** を付与しました。", ephemeral=True)
+
+
+# 1. 動的ボタン：custom_id にロールIDを埋め込み、クリックから直接ロールを解決する
+class RoleToggleButton(discord.ui.DynamicItem[discord.ui.Button], template=r'rb_m26s_role:(?P<role_id>\d+)'):
+    def __init__(self, role_id: int, label: str = "ロール", emoji=None):
+        super().__init__(
+            discord.ui.Button(
+                label=label,
+                style=discord.ButtonStyle.primary,
+                custom_id=f"rb_m26s_role:{role_id}",
+                emoji=emoji
+            )
+        )
+        self.role_id = role_id
+
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: discord.ui.Button, match: re.Match[str], /):
+        return cls(int(match['role_id']), label=item.label, emoji=item.emoji)
+
+    async def callback(self, interaction: discord.Interaction):
+        await toggle_member_role(interaction, self.role_id)
+
+
+# 2. 動的セレクトメニュー：選択肢の value にロールIDを持たせ、選んだロールの付与 / 解除を切り替える
+#    （選択肢にメンバーごとの既定値は持たせられないため、選ばなかったロールには触れない）
+class RoleSelect(discord.ui.DynamicItem[discord.ui.Select], template=r'rb_m26s_role_select'):
+    def __init__(self, options):
+        super().__init__(
+            discord.ui.Select(
+                custom_id="rb_m26s_role_select",
+                placeholder="付与 / 解除するロールを選択してください",
+                min_values=0,
+                max_values=len(options),
+                options=options
+            )
+        )
+
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: discord.ui.Select, match: re.Match[str], /):
+        return cls(item.options)
+
+    async def callback(self, interaction: discord.Interaction):
+        guild = interaction.guild
+        member = interaction.user
+        queue = _role_queue(interaction)
+        panel_roles = {int(option.value) for option in self.item.options}
+        selected = [guild.get_role(int(value)) for value in self.item.values if int(value) in panel_roles]
+
+        changes, lines = {}, []
+        for role in selected:
+            if role is None:
+                continue
+            error = _assign_error(role)
+            if error:
+                lines.append(error)
+                continue
+            # 選択したロールは保有状態を反転する
+            wanted = not queue.has_role(member, role.id)
+            changes[role.id] = wanted
+            lines.append(f"**{role.name}** を{'付与' if wanted else '解除'}しました。")
+
+        # 変更はメンバー単位でまとめて1回の編集で反映する
+        if changes:
+            queue.submit(member, changes)
+        await interaction.response.send_message("\n".join(lines) or "変更はありません。", ephemeral=True)
 
-# 1. Viewクラス：再起動後も「custom_id」を拾えるように定義
+
+# 3. 旧形式パネル用View：固定 custom_id のボタンから Embed 内のロールを特定する
 class RoleButtonView(discord.ui.View):
     def __init__(self):
         # タイムアウトをNoneに設定し、永続化
         super().__init__(timeout=None)
 
-    # ボタンを静的に配置（IDを固定）
-    # 複数のロールを作りたい場合は、ここを動的にするのではなく、
-    # 起動時に「既に発行したID」を登録する必要があります。
-    # 汎用性を高めるため、インタラクションのみを拾う設計にします。
-
     @discord.ui.button(
         label="ロールの付与 / 解除",
         style=discord.ButtonStyle.primary,
@@ -20,69 +120,98 @@ class RoleButtonView(discord.ui.View):
         emoji="✅"
     )
     async def toggle_role(self, interaction: discord.Interaction, button: discord.ui.Button):
-        # 埋め込みの description や footer から対象ロールを特定する設計、
-        # あるいは Gist に保存したロールIDを使用します。
-        
-        # 今回は最も堅牢な「EmbedからIDを読み取る」または「Gist連携」ですが、
-        # シンプルに「Embed内のメンションからIDを抽出」するロジックにします。
+        # 動的ボタン導入前に設置されたパネルのみがこの経路を通る
         description = interaction.message.embeds[0].description
         role_id_match = re.search(r'<@&(\d+)>', description)
-        
+
         if not role_id_match:
             return await interaction.response.send_message("エラー: ロールIDを特定できませんでした。", ephemeral=True)
-            
-        role_id = int(role_id_match.group(1))
-        role = interaction.guild.get_role(role_id)
-
-        if not role:
-            return await interaction.response.send_message("エラー: ロールが見つかりません。", ephemeral=True)
 
-        if role in interaction.user.roles:
-            await interaction.user.remove_roles(role)
-            await interaction.response.send_message(f"**{role.name}** を解除しました。", ephemeral=True)
-        else:
-            await interaction.user.add_roles(role)
-            await interaction.response.send_message(f"**{role.name}** を付与しました。", ephemeral=True)
+        await toggle_member_role(interaction, int(role_id_match.group(1)))
 
-import re
 
 class RolePanel(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.brand_color = 0x4285F4
+        # 連続クリックをメンバー単位で1回の member.edit にまとめる
+        self.role_queue = RoleMutationQueue(window=1.0)
 
-    # 💡 ここが最重要！再起動のたびにボタンの「待ち受け」を再開する
-    @commands.Cog.listener()
-    async def on_ready(self):
-        # ボット起動時に、このViewをリスナーとして登録
+    async def cog_load(self):
+        # 💡 起動時に動的アイテムを登録：過去に設置した全パネルのクリックをメッセージ取得なしで処理できる
+        self.bot.add_dynamic_items(RoleToggleButton, RoleSelect)
         self.bot.add_view(RoleButtonView())
-        print(f"[INFO] Persistent Role View registered.")
+
+    async def cog_unload(self):
+        self.bot.remove_dynamic_items(RoleToggleButton, RoleSelect)
 
     @app_commands.command(name="role-panel-create", description="ロール付与用のパネルを作成します。")
-    @app_commands.describe(title="パネルのタイトル", description="説明文", role="対象ロール")
+    @app_commands.describe(
+        title="パネルのタイトル", description="説明文", role="対象ロール",
+        more_roles="追加の対象ロール（メンションまたはIDを空白区切り、合計25個まで）",
+        style="ボタン形式 / セレクトメニュー形式"
+    )
+    @app_commands.choices(style=[
+        app_commands.Choice(name="ボタン", value="buttons"),
+        app_commands.Choice(name="セレクトメニュー", value="select")
+    ])
     @app_commands.checks.has_permissions(administrator=True)
-    async def create_panel(self, interaction: discord.Interaction, title: str, description: str, role: discord.Role):
+    async def create_panel(self, interaction: discord.Interaction, title: str, description: str, role: discord.Role,
+                           more_roles: str = None, style: str = "buttons"):
         await interaction.response.send_message("🔄 生成中...", ephemeral=True)
 
-        embed = self._create_embed(title, description, role)
-        # 固定された custom_id を持つ View を送信
-        await interaction.channel.send(embed=embed, view=RoleButtonView())
-        await interaction.edit_original_response(content="✅ 永続化パネルを作成しました。")
+        try:
+            roles = self._collect_roles(interaction.guild, role, more_roles)
+            embed = self._create_embed(title, description, roles)
+            await interaction.channel.send(embed=embed, view=self._create_view(roles, style))
+            await interaction.edit_original_response(content="✅ 永続化パネルを作成しました。")
+        except ValueError as e:
+            await interaction.edit_original_response(content=f"⚠️ {e}")
 
     @app_commands.command(name="role-panel-edit", description="既存のロールパネルを更新します。")
-    async def edit_panel(self, interaction: discord.Interaction, message_id: str, title: str, description: str, role: discord.Role):
+    @app_commands.describe(
+        more_roles="追加の対象ロール（メンションまたはIDを空白区切り、合計25個まで）",
+        style="ボタン形式 / セレクトメニュー形式"
+    )
+    @app_commands.choices(style=[
+        app_commands.Choice(name="ボタン", value="buttons"),
+        app_commands.Choice(name="セレクトメニュー", value="select")
+    ])
+    async def edit_panel(self, interaction: discord.Interaction, message_id: str, title: str, description: str, role: discord.Role,
+                         more_roles: str = None, style: str = "buttons"):
         try:
+            roles = self._collect_roles(interaction.guild, role, more_roles)
             target_message = await interaction.channel.fetch_message(int(message_id))
-            embed = self._create_embed(title, description, role)
-            await target_message.edit(embed=embed, view=RoleButtonView())
+            embed = self._create_embed(title, description, roles)
+            await target_message.edit(embed=embed, view=self._create_view(roles, style))
             await interaction.response.send_message("✅ パネルを更新しました。", ephemeral=True)
         except Exception as e:
             await interaction.response.send_message(f"⚠️ エラー: {e}", ephemeral=True)
 
-    def _create_embed(self, title: str, description: str, role: discord.Role):
+    def _collect_roles(self, guild: discord.Guild, role: discord.Role, more_roles: str = None):
+        roles = [role]
+        for mention_id, raw_id in ROLE_MENTION_PATTERN.findall(more_roles or ""):
+            extra = guild.get_role(int(mention_id or raw_id))
+            if extra and extra not in roles:
+                roles.append(extra)
+        if len(roles) > MAX_PANEL_ROLES:
+            raise ValueError(f"パネルに設定できるロールは {MAX_PANEL_ROLES} 個までです。")
+        return roles
+
+    def _create_view(self, roles, style: str):
+        view = discord.ui.View(timeout=None)
+        if style == "select":
+            options = [discord.SelectOption(label=r.name[:100], value=str(r.id)) for r in roles]
+            view.add_item(RoleSelect(options))
+        else:
+            for r in roles:
+                view.add_item(RoleToggleButton(r.id, label=r.name[:80]))
+        return view
+
+    def _create_embed(self, title: str, description: str, roles):
         embed = discord.Embed(
             title=title,
-            description=f"{description}\n━━━━━━━━━━━━━━\n**対象ロール:** {role.mention}",
+            description=f"{description}\n━━━━━━━━━━━━━━\n**対象ロール:** {' '.join(r.mention for r in roles)}",
             color=self.brand_color
         )
         embed.set_footer(text="Rb m/26S Role System")
@@ -2,11 +2,18 @@ import discord
 from discord import app_commands
 from discord.ext import commands
 import asyncio
+import logging
 import os
-import json
-import requests
+import time
 from datetime import datetime
 
+from utils.ticket_allocator import LeaseUnavailable, TicketNumberAllocator
+from utils.staff_dispatcher import StaffDispatcher
+from utils.ticket_index import OpenTicketIndex
+from utils.transcript import TranscriptWriter, export_channel
+
+logger = logging.getLogger(__name__)
+
 # --- 永続的なView：チケット管理用（クローズボタン） ---
 class TicketControlView(discord.ui.View):
     def __init__(self):
@@ -19,15 +26,32 @@ class TicketControlView(discord.ui.View):
         emoji="🔒"
     )
     async def close_ticket(self, interaction: discord.Interaction, button: discord.ui.Button):
-        """チケットチャンネルを削除する"""
-        await interaction.response.send_message("🔓 **チケットを閉鎖します。**\n5秒後にこのチャンネルを削除します。", ephemeral=False)
-        await asyncio.sleep(5)
+        """トランスクリプトをログチャンネルへ保存してから、チケットチャンネルを削除する"""
+        cog = interaction.client.get_cog("TicketSystem")
+        channel = interaction.channel
+        if channel.id in cog.closing:
+            return await interaction.response.send_message("⏳ 既に閉鎖処理中です。", ephemeral=True)
+
+        cog.closing.add(channel.id)
         try:
-            await interaction.channel.delete()
-        except discord.Forbidden:
-            await interaction.channel.send("⚠️ チャンネル削除権限が不足しています（ボットのロール位置を確認してください）。")
-        except discord.HTTPException:
-            pass
+            await interaction.response.send_message("🔓 **チケットを閉鎖します。**\n記録を保存した後、このチャンネルを削除します。", ephemeral=False)
+
+            # 1. 履歴を圧縮して保存（失敗した場合は記録を失わないよう削除を中止）
+            if not await cog.archive_transcript(channel, closed_by=interaction.user):
+                return await channel.send("⚠️ 記録の保存に失敗したため、削除を中止しました。再度お試しください。")
+
+            # 2. チャンネル削除
+            await asyncio.sleep(5)
+            try:
+                await channel.delete()
+                cog.forget_ticket(channel)
+                cog.ticket_events.labels("closed").inc()
+            except discord.Forbidden:
+                await channel.send("⚠️ チャンネル削除権限が不足しています（ボットのロール位置を確認してください）。")
+            except discord.HTTPException:
+                pass
+        finally:
+            cog.closing.discard(channel.id)
 
 # --- 永続的なView：チケット作成用 ---
 class TicketCreateView(discord.ui.View):
@@ -46,13 +70,27 @@ class TicketCreateView(discord.ui.View):
         # 処理中であることをユーザーに伝える
         await interaction.response.defer(ephemeral=True)
 
-        # 1. Gistから現在のチケット番号を取得・更新（非同期スレッド実行）
-        data = await self.cog.sync_gist("load")
-        count = data.get("ticket_count", 0) + 1
-        await self.cog.sync_gist("save", {"ticket_count": count})
-
         guild = interaction.guild
         user = interaction.user
+
+        # 0. 1人あたりの未解決チケット数の上限を確認し、作成枠を予約する（番号の払い出し前に判定）
+        index = self.cog.index
+        if not index.reserve(guild.id, user.id, self.cog.per_user_limit):
+            existing = " ".join(f"<#{cid}>" for cid in index.channels(guild.id, user.id))
+            return await interaction.followup.send(f"⚠️ 未解決のチケットがあります: {existing or '作成処理中'}", ephemeral=True)
+
+        try:
+            await self._open_ticket(interaction, guild, user)
+        finally:
+            index.release(guild.id, user.id)
+
+    async def _open_ticket(self, interaction: discord.Interaction, guild: discord.Guild, user):
+        # 1. リース済みブロックからチケット番号をメモリ上で払い出す
+        try:
+            count = await self.cog.allocator.allocate()
+        except LeaseUnavailable:
+            self.cog.ticket_events.labels("failed").inc()
+            return await interaction.followup.send("⚠️ 現在チケット番号を発行できません。しばらくしてから再度お試しください。", ephemeral=True)
         
         # 2. パネルが設置されている現在のカテゴリを取得
         target_category = interaction.channel.category
@@ -73,8 +111,12 @@ class TicketCreateView(discord.ui.View):
                 overwrites=overwrites,
                 topic=f"User ID: {user.id} | 発行日時: {datetime.now().strftime('%Y-%m-%d %H:%M')}"
             )
+            self.cog.index.add(guild.id, user.id, channel.id)
+
+            # 5. 担当スタッフの自動割り当て（閲覧権限を付与してメンション）
+            staff = await self.cog.assign_staff(channel)
             
-            # 5. チケット内案内メッセージ
+            # 6. チケット内案内メッセージ
             embed = discord.Embed(
                 title=f"🎫 チケット受付 #{count:03d}",
                 description=(
@@ -85,63 +127,239 @@ class TicketCreateView(discord.ui.View):
                 color=0x2ECC71,
                 timestamp=datetime.now()
             )
+            if staff is not None:
+                embed.add_field(name="担当スタッフ", value=staff.mention, inline=False)
             embed.set_footer(text="Rb m/26S Support Protocol")
             
-            await channel.send(embed=embed, view=TicketControlView())
+            await channel.send(content=staff.mention if staff else None, embed=embed, view=TicketControlView())
             
-            # 6. 完了報告（作成者にのみ見える）
+            # 7. 完了報告（作成者にのみ見える）
             await interaction.followup.send(f"✅ チケットを作成しました: {channel.mention}", ephemeral=True)
+            self.cog.ticket_events.labels("created").inc()
             
         except Exception as e:
+            self.cog.ticket_events.labels("failed").inc()
             await interaction.followup.send(f"⚠️ エラーが発生しました: {e}", ephemeral=True)
 
 class TicketSystem(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.gist_id = os.getenv("GIST_ID")
-        self.gist_token = os.getenv("GIST_TOKEN")
-        self.filename = "rb_m26s_data.json"
-
-    async def sync_gist(self, action="load", new_data=None):
-        """Gistとの非同期通信（スレッド化でメインループを止めない）"""
-        def _sync_request():
-            headers = {"Authorization": f"token {self.gist_token}"}
-            url = f"https://api.github.com/gists/{self.gist_id}"
-            
+        # チケット番号はGistから50件単位でリースして払い出す
+        self.allocator = TicketNumberAllocator(bot.state, key="ticket_count", block_size=50)
+        self.ticket_events = bot.metrics.counter("ticket_events_total", "Ticket lifecycle events", ("event",))
+        # 閉鎖処理中のチャンネル（連打による多重エクスポート防止）
+        self.closing = set()
+        # 未解決チケットの索引と1人あたりの上限（TICKET_LIMIT_PER_USER、0で無制限）
+        self.index = OpenTicketIndex()
+        self.per_user_limit = int(os.getenv("TICKET_LIMIT_PER_USER", "1"))
+        # ギルド別の担当スタッフ割り当て {guild_id: StaffDispatcher} と初回応答待ち {channel_id: 割り当て時刻}
+        self.dispatchers = {}
+        self._awaiting = {}
+        self._restored_responses = {}   # スナップショットから復元した応答時間 {guild_id: {staff_id: 秒}}
+        # 軽量メンバーキャッシュではロールのメンバーも在席状況も取得できないため自動割り当てを無効化する
+        self.auto_assign = not bot.lean_member_cache
+
+    # --- 担当スタッフの割り当て ---
+    def _staff_role(self, guild: discord.Guild):
+        role_id = self.bot.state.get("ticket_staff_roles", {}).get(str(guild.id))
+        return guild.get_role(int(role_id)) if role_id else None
+
+    def _dispatcher(self, guild: discord.Guild):
+        dispatcher = self.dispatchers.get(guild.id)
+        if dispatcher is None:
+            dispatcher = self.dispatchers[guild.id] = StaffDispatcher()
+        return dispatcher
+
+    def _rebuild_dispatcher(self, guild: discord.Guild):
+        """スタッフロールの在席状況と、チケットの個別権限（担当者）から割り当て状態を復元する"""
+        previous = self.dispatchers.pop(guild.id, None)
+        responses = previous.response_times() if previous else self._restored_responses.pop(guild.id, {})
+        role = self._staff_role(guild)
+        if role is None or not self.auto_assign:
+            return
+        dispatcher = self._dispatcher(guild)
+        for staff_id, seconds in responses.items():
+            dispatcher.seed_response(staff_id, seconds)
+        staff_ids = {m.id for m in role.members}
+        for member in role.members:
+            dispatcher.set_available(member.id, member.status != discord.Status.offline)
+        for channel_id, owner_id in self.index.open_tickets(guild.id):
+            channel = guild.get_channel(channel_id)
+            if channel is None:
+                continue
+            for target in channel.overwrites:
+                if target.id in staff_ids and target.id != owner_id:
+                    dispatcher.attach(channel_id, target.id)
+                    break
+
+    async def assign_staff(self, channel: discord.TextChannel):
+        """最も負荷の低い在席スタッフを割り当て、閲覧権限を付与して返す（不在なら None）"""
+        if not self.auto_assign or self._staff_role(channel.guild) is None:
+            return None
+        staff_id = self._dispatcher(channel.guild).assign(channel.id)
+        staff = channel.guild.get_member(staff_id) if staff_id else None
+        if staff is None:
+            return None
+        try:
+            await channel.set_permissions(staff, read_messages=True, send_messages=True, attach_files=True, embed_links=True)
+        except discord.HTTPException as e:
+            logger.error("Failed to grant ticket access to %s in #%s: %s", staff, channel.name, e)
+        self._awaiting[channel.id] = time.monotonic()
+        return staff
+
+    async def _reassign_from(self, member: discord.Member):
+        """オフラインになったスタッフの未応答チケットを他の在席スタッフへ移す"""
+        dispatcher = self.dispatchers.get(member.guild.id)
+        if dispatcher is None:
+            return
+        for channel_id in dispatcher.tickets_of(member.id):
+            if channel_id not in self._awaiting:
+                continue
+            channel = member.guild.get_channel(channel_id)
+            if channel is None:
+                dispatcher.release(channel_id)
+                continue
+            staff = await self.assign_staff(channel)
+            if staff is None:
+                # 他に在席者がいない場合は元の担当のまま
+                continue
             try:
-                # ロード
-                res = requests.get(url, headers=headers, timeout=10)
-                if res.status_code != 200:
-                    return {"ticket_count": 0}
-                
-                content = res.json()["files"].get(self.filename, {}).get("content", "{}")
-                data = json.loads(content)
-                
-                # セーブ
-                if action == "save" and new_data:
-                    data.update(new_data)
-                    payload = {
-                        "files": {
-                            self.filename: {
-                                "content": json.dumps(data, indent=4, ensure_ascii=False)
-                            }
-                        }
-                    }
-                    requests.patch(url, headers=headers, json=payload, timeout=10)
-                
-                return data
-            except Exception as e:
-                print(f"[ERROR] Gist Sync Error: {e}")
-                return {"ticket_count": 0}
-
-        return await asyncio.to_thread(_sync_request)
+                await channel.set_permissions(member, overwrite=None)
+                await channel.send(f"🔁 {member.mention} が不在となったため、担当を {staff.mention} に変更しました。")
+            except discord.HTTPException as e:
+                logger.error("Failed to hand over #%s to %s: %s", channel.name, staff, e)
+
+    def forget_ticket(self, channel):
+        """閉鎖・削除されたチケットを索引と割り当てから外す"""
+        self.index.remove_channel(channel.id)
+        self._awaiting.pop(channel.id, None)
+        dispatcher = self.dispatchers.get(channel.guild.id)
+        if dispatcher is not None:
+            dispatcher.release(channel.id)
+
+    def _log_channel(self, guild: discord.Guild):
+        channel_id = self.bot.state.get("ticket_log_channels", {}).get(str(guild.id))
+        return guild.get_channel(int(channel_id)) if channel_id else None
+
+    async def archive_transcript(self, channel: discord.TextChannel, closed_by=None):
+        """チャンネル履歴を gzip 圧縮の JSONL としてログチャンネルへアップロードする
+
+        ログチャンネル未設定の場合は何もせず True を返す。保存に失敗した場合のみ False。
+        """
+        log_channel = self._log_channel(channel.guild)
+        if log_channel is None:
+            return True
+
+        # 1ファイルあたりのアップロード上限を超える長いチケットは分割して保存する
+        writer = TranscriptWriter(part_bytes=log_channel.guild.filesize_limit)
+        try:
+            count = await export_channel(channel, writer)
+            parts = await writer.finish()
+            size = sum(part_size for _, part_size in parts)
+
+            embed = discord.Embed(
+                title=f"🗄️ チケット記録: #{channel.name}",
+                description=f"{channel.topic or ''}",
+                color=0x95A5A6,
+                timestamp=datetime.now()
+            )
+            embed.add_field(name="メッセージ数", value=str(count), inline=True)
+            embed.add_field(name="サイズ", value=f"{size / 1024:.1f} KiB", inline=True)
+            if closed_by is not None:
+                embed.add_field(name="閉鎖者", value=closed_by.mention, inline=True)
+            if len(parts) > 1:
+                embed.add_field(name="分割数", value=str(len(parts)), inline=True)
+            embed.set_footer(text="Rb m/26S Support Protocol")
+
+            # 添付の合計サイズにも上限があるため、分割ファイルは1メッセージに1つずつ送る
+            for number, (fileobj, _) in enumerate(parts, 1):
+                filename = f"{channel.name}.jsonl.gz" if len(parts) == 1 else f"{channel.name}.part{number}.jsonl.gz"
+                if number == 1:
+                    await log_channel.send(embed=embed, file=discord.File(fileobj, filename=filename))
+                else:
+                    await log_channel.send(f"#{channel.name} ({number}/{len(parts)})", file=discord.File(fileobj, filename=filename))
+            return True
+        except Exception as e:
+            logger.error("Transcript export for #%s failed: %s", channel.name, e, exc_info=True)
+            return False
+        finally:
+            writer.close()
+
+    async def cog_load(self):
+        self.allocator.prime()
+        self.bot.snapshots.register("ticket_staff_response", self._dump_responses, self._restore_responses, max_age=7 * 86400)
+
+    async def cog_unload(self):
+        self.bot.snapshots.unregister("ticket_staff_response")
+
+    def _dump_responses(self):
+        data = {str(gid): d.response_times() for gid, d in self.dispatchers.items()}
+        for gid, responses in self._restored_responses.items():
+            data.setdefault(str(gid), responses)
+        return {gid: {str(sid): t for sid, t in responses.items()} for gid, responses in data.items() if responses}
+
+    def _restore_responses(self, data):
+        self._restored_responses = {
+            int(gid): {int(sid): float(t) for sid, t in responses.items()} for gid, responses in data.items()
+        }
 
     @commands.Cog.listener()
     async def on_ready(self):
-        """再起動時にボタンの待機状態を復元"""
+        """再起動時にボタンの待機状態を復元し、未解決チケットの索引を再構築"""
         self.bot.add_view(TicketCreateView(self))
         self.bot.add_view(TicketControlView())
-        print(f"[INFO] Ticket System: Persistent Views Successfully Registered.")
+        logger.info("Ticket System: Persistent Views Successfully Registered.")
+        open_tickets = self.index.rebuild(self.bot.guilds)
+        logger.info(f"Ticket System: Indexed {open_tickets} open tickets.")
+        if not self.auto_assign:
+            if self.bot.state.get("ticket_staff_roles", {}):
+                logger.warning("Ticket System: staff auto-assignment is disabled under MEMBER_CACHE_POLICY=lean "
+                               "(role members and presences are not cached).")
+            return
+        for guild in self.bot.guilds:
+            self._rebuild_dispatcher(guild)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_delete(self, channel):
+        self.forget_ticket(channel)
+
+    @commands.Cog.listener()
+    async def on_message(self, message):
+        """担当スタッフの初回応答までの時間を記録する"""
+        assigned_at = self._awaiting.get(message.channel.id)
+        if assigned_at is None or message.guild is None:
+            return
+        dispatcher = self.dispatchers.get(message.guild.id)
+        if dispatcher is not None and dispatcher.assignee(message.channel.id) == message.author.id:
+            del self._awaiting[message.channel.id]
+            dispatcher.record_response(message.author.id, time.monotonic() - assigned_at)
+
+    @commands.Cog.listener()
+    async def on_presence_update(self, before, after):
+        """スタッフの在席状況に合わせて割り当て対象を更新し、離席時は未応答チケットを再割り当てする"""
+        dispatcher = self.dispatchers.get(after.guild.id)
+        if dispatcher is None or before.status == after.status:
+            return
+        role = self._staff_role(after.guild)
+        if role is None or after.get_role(role.id) is None:
+            return
+        online = after.status != discord.Status.offline
+        dispatcher.set_available(after.id, online)
+        if not online:
+            await self._reassign_from(after)
+
+    @commands.Cog.listener()
+    async def on_member_update(self, before, after):
+        """スタッフロールの付与 / 解除を反映する"""
+        if not self.auto_assign:
+            return
+        role = self._staff_role(after.guild)
+        if role is None or (before.get_role(role.id) is None) == (after.get_role(role.id) is None):
+            return
+        is_staff = after.get_role(role.id) is not None
+        self._dispatcher(after.guild).set_available(after.id, is_staff and after.status != discord.Status.offline)
+        if not is_staff:
+            await self._reassign_from(after)
 
     @app_commands.command(name="ticket-panel-create", description="【運営専用】チケット作成パネルをこのチャンネルに設置します。")
     @app_commands.checks.has_permissions(administrator=True)
@@ -157,5 +375,39 @@ class TicketSystem(commands.Cog):
         await interaction.channel.send(embed=embed, view=TicketCreateView(self))
         await interaction.response.send_message("✅ パネルを設置しました。動作テストを行ってください。", ephemeral=True)
 
+    @app_commands.command(name="ticket-log-channel", description="【運営専用】閉鎖したチケットの記録を保存するチャンネルを設定します。")
+    @app_commands.describe(channel="記録の保存先（未指定で解除）")
+    @app_commands.checks.has_permissions(administrator=True)
+    async def set_log_channel(self, interaction: discord.Interaction, channel: discord.TextChannel = None):
+        """チケット記録の保存先を設定（Gistに永続化）"""
+        channels = dict(self.bot.state.get("ticket_log_channels", {}))
+        if channel is None:
+            channels.pop(str(interaction.guild.id), None)
+            message = "✅ 記録の保存を無効化しました。"
+        else:
+            channels[str(interaction.guild.id)] = channel.id
+            message = f"✅ チケットの記録を {channel.mention} に保存します。"
+        self.bot.state.update({"ticket_log_channels": channels})
+        await interaction.response.send_message(message, ephemeral=True)
+
+    @app_commands.command(name="ticket-staff-role", description="【運営専用】チケットを自動で割り当てるスタッフロールを設定します。")
+    @app_commands.describe(role="担当スタッフのロール（未指定で自動割り当てを解除）")
+    @app_commands.checks.has_permissions(administrator=True)
+    async def set_staff_role(self, interaction: discord.Interaction, role: discord.Role = None):
+        """担当スタッフロールを設定（Gistに永続化）"""
+        roles = dict(self.bot.state.get("ticket_staff_roles", {}))
+        if role is None:
+            roles.pop(str(interaction.guild.id), None)
+            message = "✅ 担当スタッフの自動割り当てを解除しました。"
+        else:
+            roles[str(interaction.guild.id)] = role.id
+            message = f"✅ {role.mention} のオンラインメンバーへチケットを割り当てます。"
+            if not self.auto_assign:
+                message = (f"⚠️ {role.mention} を登録しましたが、軽量メンバーキャッシュ（MEMBER_CACHE_POLICY=lean）"
+                           "ではスタッフの在席状況を取得できないため、自動割り当ては行われません。")
+        self.bot.state.update({"ticket_staff_roles": roles})
+        self._rebuild_dispatcher(interaction.guild)
+        await interaction.response.send_message(message, ephemeral=True)
+
 async def setup(bot):
     await bot.add_cog(TicketSystem(bot))
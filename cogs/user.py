@@ -1,52 +1,42 @@
 import discord
 from discord import app_commands
 from discord.ext import commands
+import asyncio
+from collections import OrderedDict
 from datetime import datetime
 import pytz
 
-class UserInspector(commands.Cog):
-    def __init__(self, bot):
-        self.bot = bot
-        self.stb_blue = 0x4285F4
-        self.jst = pytz.timezone('Asia/Tokyo')
-
-    @app_commands.command(name="user", description="ユーザーの詳細情報（ステータス・アクティビティ・デバイス等）を解析します。")
-    @app_commands.describe(member="解析対象のユーザー")
-    async def inspect(self, interaction: discord.Interaction, member: discord.Member = None):
-        """ユーザー情報の完全解析（プレゼンス・デバイス・アイコン対応版）"""
-        
-        # 1. 処理中メッセージ
-        process_embed = discord.Embed(
-            description="🔄 ユーザープロファイルをスキャン中...",
-            color=self.stb_blue
-        )
-        await interaction.response.send_message(embed=process_embed)
+# ステータス表示（全体）
+STATUS_MAP = {
+    discord.Status.online: "🟢 オンライン",
+    discord.Status.idle: "🌙 退席中",
+    discord.Status.dnd: "⛔ 取り込み中",
+    discord.Status.offline: "⚪ オフライン"
+}
 
-        target = member or interaction.user
-        
-        # --- データ解析セクション ---
 
-        # 1. 時間計算
-        now = datetime.now(pytz.utc)
-        created_delta = (now - target.created_at).days
-        joined_delta = (now - target.joined_at).days
+class MemberSnapshot:
+    """/user の表示に必要な派生データ（イベントで無効化されるまで再利用する）"""
+    __slots__ = ("role_display", "role_count", "client_display", "activity_display", "flag_display", "main_status")
 
-        # 2. ロール（@everyone除外・上位表示）
-        roles = sorted(target.roles, key=lambda r: r.position, reverse=True)
-        role_mentions = [r.mention for r in roles if r != interaction.guild.default_role]
-        role_display = " ".join(role_mentions) if role_mentions else "なし"
+    def __init__(self, member: discord.Member):
+        # 1. ロール（@everyone除外・上位表示）
+        roles = sorted(member.roles, key=lambda r: r.position, reverse=True)
+        role_mentions = [r.mention for r in roles if not r.is_default()]
+        self.role_display = " ".join(role_mentions) if role_mentions else "なし"
+        self.role_count = len(role_mentions)
 
-        # 3. デバイス状態の正確な取得
+        # 2. デバイス状態の正確な取得
         clients = []
-        if str(target.desktop_status) != 'offline': clients.append("🖥️ Desktop")
-        if str(target.mobile_status) != 'offline': clients.append("📱 Mobile")
-        if str(target.web_status) != 'offline': clients.append("🌐 Web")
-        client_display = " / ".join(clients) if clients else "⚫ Offline"
+        if str(member.desktop_status) != 'offline': clients.append("🖥️ Desktop")
+        if str(member.mobile_status) != 'offline': clients.append("📱 Mobile")
+        if str(member.web_status) != 'offline': clients.append("🌐 Web")
+        self.client_display = " / ".join(clients) if clients else "⚫ Offline"
 
-        # 4. アクティビティ（ゲーム・Spotify・カスタムステータス）の解析
+        # 3. アクティビティ（ゲーム・Spotify・カスタムステータス）の解析
         activities = []
         # カスタムステータス
-        for activity in target.activities:
+        for activity in member.activities:
             if isinstance(activity, discord.CustomActivity):
                 emoji = f"{activity.emoji} " if activity.emoji else ""
                 name = activity.name if activity.name else ""
@@ -62,11 +52,11 @@ class UserInspector(commands.Cog):
             elif activity.type == discord.ActivityType.watching:
                 activities.append(f"📺 **Watching:** {activity.name}")
 
-        activity_display = "\n".join(activities) if activities else "アクティビティなし"
+        self.activity_display = "\n".join(activities) if activities else "アクティビティなし"
 
-        # 5. バッジ（パブリックフラグ）の完全取得
+        # 4. バッジ（パブリックフラグ）の完全取得
         flags = []
-        uf = target.public_flags
+        uf = member.public_flags
         if uf.staff: flags.append("<:staff:1> Discord Staff") # 必要なら絵文字IDを入れる、ここはテキストで代用
         if uf.partner: flags.append("Partner")
         if uf.hypesquad: flags.append("HypeSquad Events")
@@ -79,21 +69,124 @@ class UserInspector(commands.Cog):
         if uf.hypesquad_balance: flags.append("HypeSquad Balance")
         if uf.hypesquad_bravery: flags.append("HypeSquad Bravery")
         if uf.hypesquad_brilliance: flags.append("HypeSquad Brilliance")
-        
-        flag_display = ", ".join(flags) if flags else "なし"
 
-        # 6. ステータス表示（全体）
-        status_map = {
-            discord.Status.online: "🟢 オンライン",
-            discord.Status.idle: "🌙 退席中",
-            discord.Status.dnd: "⛔ 取り込み中",
-            discord.Status.offline: "⚪ オフライン"
-        }
-        main_status = status_map.get(target.status, "不明")
+        self.flag_display = ", ".join(flags) if flags else "なし"
+
+        # 5. ステータス表示（全体）
+        self.main_status = STATUS_MAP.get(member.status, "不明")
+
+
+class UserInspector(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+        self.stb_blue = 0x4285F4
+        self.jst = pytz.timezone('Asia/Tokyo')
+
+        # メンバー別スナップショットのLRU {(guild_id, member_id): MemberSnapshot}
+        self.snapshots = OrderedDict()
+        self.max_snapshots = 1024
+
+    # --- スナップショットキャッシュ ---
+    def _snapshot(self, member: discord.Member):
+        key = (member.guild.id, member.id)
+        snapshot = self.snapshots.get(key)
+        if snapshot is None:
+            snapshot = self.snapshots[key] = MemberSnapshot(member)
+            if len(self.snapshots) > self.max_snapshots:
+                self.snapshots.popitem(last=False)
+        else:
+            self.snapshots.move_to_end(key)
+        return snapshot
+
+    def _invalidate(self, guild_id, member_id):
+        self.snapshots.pop((guild_id, member_id), None)
+
+    @commands.Cog.listener()
+    async def on_member_update(self, before, after):
+        """ロール・ニックネーム等の変更"""
+        self._invalidate(after.guild.id, after.id)
+
+    @commands.Cog.listener()
+    async def on_presence_update(self, before, after):
+        """ステータス・デバイス・アクティビティの変更"""
+        self._invalidate(after.guild.id, after.id)
+
+    @commands.Cog.listener()
+    async def on_user_update(self, before, after):
+        """アバター・バッジ等のユーザー単位の変更（共通サーバー分のみ無効化）"""
+        for guild in after.mutual_guilds:
+            self._invalidate(guild.id, after.id)
+
+    @commands.Cog.listener()
+    async def on_raw_member_remove(self, payload):
+        # 軽量キャッシュモードでは on_member_remove が発火しないため raw イベントで受ける
+        self._invalidate(payload.guild_id, payload.user.id)
+        self.bot.recent_members.discard(payload.guild_id, payload.user.id)
+
+    @commands.Cog.listener()
+    async def on_guild_role_update(self, before, after):
+        """ロールの並び順はメンバー側のイベントでは通知されないため、ギルド単位で破棄する"""
+        if before.position != after.position:
+            self._invalidate_guild(after.guild.id)
+
+    @commands.Cog.listener()
+    async def on_guild_role_delete(self, role):
+        self._invalidate_guild(role.guild.id)
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild):
+        self._invalidate_guild(guild.id)
+        self.bot.recent_members.drop_guild(guild.id)
+
+    def _invalidate_guild(self, guild_id):
+        for key in [k for k in self.snapshots if k[0] == guild_id]:
+            del self.snapshots[key]
+
+    async def _resolve_member(self, guild: discord.Guild, member: discord.Member):
+        """プレゼンス付きのメンバーを取得する
+
+        通常モードはライブラリのキャッシュを使う。軽量キャッシュモードでは最近のメンバーのLRUを引き、
+        無ければゲートウェイへプレゼンス付きで1件だけ照会する（キャッシュには載せない）。
+        """
+        cached = guild.get_member(member.id)
+        if cached is not None or not self.bot.lean_member_cache:
+            return cached or member
+
+        recent = self.bot.recent_members.get(guild.id, member.id)
+        if recent is not None:
+            return recent
+
+        try:
+            found = await asyncio.wait_for(
+                guild.query_members(user_ids=[member.id], presences=True, cache=False), timeout=2.0
+            )
+        except (asyncio.TimeoutError, discord.ClientException):
+            return member
+        if not found:
+            return member
+
+        # 取得し直したプレゼンスで派生データを作り直す
+        self._invalidate(guild.id, member.id)
+        self.bot.recent_members.put(found[0])
+        return found[0]
+
+    @app_commands.command(name="user", description="ユーザーの詳細情報（ステータス・アクティビティ・デバイス等）を解析します。")
+    @app_commands.describe(member="解析対象のユーザー")
+    async def inspect(self, interaction: discord.Interaction, member: discord.Member = None):
+        """ユーザー情報の完全解析（プレゼンス・デバイス・アイコン対応版）"""
+        target = await self._resolve_member(interaction.guild, member or interaction.user)
+
+        # --- データ解析セクション（派生データはスナップショットから取得） ---
+        snapshot = self._snapshot(target)
+
+        # 時間計算
+        now = datetime.now(pytz.utc)
+        created_delta = (now - target.created_at).days
+        joined_delta = (now - target.joined_at).days
 
 
         # --- Embed生成セクション ---
-        
+
         embed = discord.Embed(
             title=f"User Analysis: {target.display_name}",
             color=target.color if target.color != discord.Color.default() else self.stb_blue, # ユーザーカラーがあれば優先
@@ -102,7 +195,7 @@ class UserInspector(commands.Cog):
 
         # サムネイルと「拡大表示」リンクの作成
         embed.set_thumbnail(url=target.display_avatar.url)
-        
+
         # ユーザー基本情報（IDをここに明記）
         embed.add_field(
             name="🆔 識別データ",
@@ -118,9 +211,9 @@ class UserInspector(commands.Cog):
         embed.add_field(
             name="📡 現在の状況",
             value=(
-                f"**Main Status:** {main_status}\n"
-                f"**Devices:** {client_display}\n"
-                f"**Activities:**\n{activity_display}"
+                f"**Main Status:** {snapshot.main_status}\n"
+                f"**Devices:** {snapshot.client_display}\n"
+                f"**Activities:**\n{snapshot.activity_display}"
             ),
             inline=False
         )
@@ -129,7 +222,7 @@ class UserInspector(commands.Cog):
         embed.add_field(
             name="🛡️ アカウント属性",
             value=(
-                f"**Badges:** {flag_display}\n"
+                f"**Badges:** {snapshot.flag_display}\n"
                 f"**Bot:** {'🤖 Yes' if target.bot else '👤 No'}\n"
                 f"**Created:** <t:{int(target.created_at.timestamp())}:D> ({created_delta} days ago)\n"
                 f"**Joined:** <t:{int(target.joined_at.timestamp())}:D> ({joined_delta} days ago)"
@@ -139,15 +232,15 @@ class UserInspector(commands.Cog):
 
         # ロール
         embed.add_field(
-            name=f"🎭 保有ロール ({len(roles)-1})", # @everyone分を引く
-            value=role_display if len(role_display) < 1024 else "（多すぎるため省略）",
+            name=f"🎭 保有ロール ({snapshot.role_count})",
+            value=snapshot.role_display if len(snapshot.role_display) < 1024 else "（多すぎるため省略）",
             inline=False
         )
 
         embed.set_footer(text="Rb m/26S User Inspection System • 瑞典技術設計局")
 
-        # 結果を送信（編集）
-        await interaction.edit_original_response(embed=embed)
+        # 結果を1回の応答で送信
+        await interaction.response.send_message(embed=embed)
 
 async def setup(bot):
     await bot.add_cog(UserInspector(bot))
@@ -1,182 +1,507 @@
 import discord
 from discord import app_commands
-from discord.ext import commands, tasks
-import feedparser
-import json
-import os
+from discord.ext import commands
 import asyncio
+import logging
+import os
 import re
-import requests
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+
+from utils.feed_scheduler import FeedScheduler
+from utils.seen_index import SeenIndex
+from utils.upload_model import UploadModel
+
+logger = logging.getLogger(__name__)
+
+# YouTubeのチャンネルIDは "UC" + 22文字
+CHANNEL_ID_PATTERN = re.compile(r"^UC[\w-]{22}$")
+# Embedフィールド値の上限（Discord API）
+FIELD_LIMIT = 1024
+
+
+def _fit_field(lines, limit=FIELD_LIMIT):
+    """フィールド値の上限に収まる行数だけ連結し、残りは件数で示す"""
+    if not lines:
+        return "None"
+    value = ""
+    for shown, line in enumerate(lines):
+        rest = len(lines) - shown - 1
+        candidate = f"{value}\n{line}" if value else line
+        # 残りがある場合は「…ほか N 件」の行が入る余地を残す
+        reserve = len(f"\n…ほか {rest} 件") if rest else 0
+        if len(candidate) + reserve > limit:
+            return "\n".join(filter(None, (value, f"…ほか {len(lines) - shown} 件")))
+        value = candidate
+    return value
+
+
+STATE_NOT_READY = "⚠️ Gist外部メモリを読み込み中のため、購読を変更できません。しばらくしてから再度お試しください。"
 
 class YouTubeMonitor(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.channel_id = "UC1owxxoNexXWbJ-ri7r5-ww"
-        self.rss_url = f"https://www.youtube.com/feeds/videos.xml?channel_id={self.channel_id}"
+        self.channel_id = "UC1owxxoNexXWbJ-ri7r5-ww"  # /admin-yt-setup の既定フィード
         self.yt_red = 0xFF0000 
-        
-        # 外部ストレージ設定 (Mizunori.TDB Persistent Protocol)
-        self.gist_id = os.getenv("GIST_ID")
-        self.gist_token = os.getenv("GIST_TOKEN")
-        self.filename = "rb_m26s_data.json"
-
-        # メモリ上のデータ構造（欠落防止用初期値）
-        self.data_cache = {
-            "channel_id": None, 
-            "role_id": None, 
-            "last_video_id": "",
-            "last_updated": ""
-        }
 
-        self.monitor_loop.start()
+        # 購読テーブル（subscriptions）のフィード別の逆引き
+        self.by_feed = {}
+        # 購読別の通知済み動画ID集合（sub["seen"] に空白区切りで永続化）
+        self.seen = {}
+        # Gistの状態を読み込み、購読テーブルから監視を開始したか
+        self.active = False
+        self._activation = None
+
+        # 条件付きGETの統計（304 = フィード未更新でパース省略）
+        self.poll_stats = {"polls": 0, "not_modified": 0, "modified": 0, "errors": 0}
+
+        # 同一フィードのポーリングとプッシュ通知が同時に通知処理へ入らないようにする
+        self._feed_locks = {}
+
+        # WebSubプッシュモード（WEBSUB_CALLBACK_URL 設定時のみ有効）
+        self.websub = None
+        callback_url = os.getenv("WEBSUB_CALLBACK_URL")
+        if callback_url:
+            # プッシュモードを使わない構成では購読サーバー一式を読み込まない
+            from utils.websub import WebSubSubscriber
+            self.websub = WebSubSubscriber(
+                bot.web, callback_url, self.on_push,
+                secret=os.getenv("WEBSUB_SECRET"),
+                port=int(os.getenv("WEBSUB_PORT", "8080"))
+            )
+
+        # フィード別の投稿時刻モデル（ポーリング間隔の適応制御）
+        self.models = {}
+        self.min_interval = float(os.getenv("YT_POLL_MIN_INTERVAL", "60"))
+        self.max_interval = float(os.getenv("YT_POLL_MAX_INTERVAL", "3600"))
+
+        # 全フィードを周期内へ分散させ、同時取得数を制限してポーリングする
+        # （プッシュモードでは取りこぼし対策の固定・低頻度フォールバックとして動作）
+        default_interval = "1800" if self.websub else "300"
+        self.scheduler = FeedScheduler(
+            self.poll_feed,
+            interval=float(os.getenv("YT_POLL_INTERVAL", default_interval)),
+            max_concurrency=int(os.getenv("YT_POLL_CONCURRENCY", "8")),
+            interval_for=None if self.websub else self._interval_for
+        )
+
+    # --- 状態ストア上のテーブル（複製を持たず、常に状態ストアの辞書を直接参照する） ---
+    def _state_table(self, key):
+        data = self.bot.state.data
+        if not isinstance(data.get(key), dict):
+            data[key] = {}
+        return data[key]
+
+    @property
+    def subscriptions(self):
+        """購読テーブル {"<feed_id>:<discord_channel_id>": {...}}"""
+        return self._state_table("yt_subscriptions")
+
+    @property
+    def validators(self):
+        """フィード別の検証子 {feed_id: [etag, last_modified]}（通知完了後に永続化）"""
+        return self._state_table("yt_feed_validators")
 
-    def cog_unload(self):
-        self.monitor_loop.cancel()
+    async def cog_load(self):
+        # 投稿時刻モデルはスナップショットから復元し、初回の全件取得を省く
+        self.bot.snapshots.register("yt_upload_models", self._dump_models, self._restore_models, max_age=7 * 86400)
 
-    def sync_gist(self, action="load", new_data=None):
-        """Gist外部メモリとのデータ同期プロトコル"""
-        if not self.gist_id or not self.gist_token:
-            print("[CRITICAL] Rb m/26S Error: Gist credentials missing in Environment Variables.")
-            return self.data_cache
+        if self.websub is not None:
+            await self.websub.start()
+        self.scheduler.start()
 
-        headers = {
-            "Authorization": f"token {self.gist_token}",
-            "Accept": "application/vnd.github.v3+json"
+        state = self.bot.state
+        if state.loaded or not state.enabled:
+            self._activate()
+        else:
+            # 起動時のGist読み込みに失敗した場合は、読み込めるまで監視の開始を保留する
+            self._activation = asyncio.create_task(self._activate_when_loaded())
+
+    async def _activate_when_loaded(self, delay=5.0):
+        while not await self.bot.state.ensure_loaded():
+            logger.warning("YouTube monitor is waiting for the Gist state; retrying in %.0fs.", delay)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 300.0)
+        self._activation = None
+        self._activate()
+
+    def _activate(self):
+        """読み込み済みの購読テーブルから監視を開始する"""
+        state = self.bot.state
+
+        # 旧形式（単一チャンネル構成）からの移行
+        if not self.subscriptions and state.get("channel_id"):
+            self._put_subscription(
+                self.channel_id, None, state.get("channel_id"), state.get("role_id"),
+                previous={"last_video_id": state.get("last_video_id", "")}
+            )
+            self.validators.setdefault(self.channel_id, [state.get("feed_etag", ""), state.get("feed_last_modified", "")])
+            state.update({"channel_id": None, "role_id": None, "last_video_id": None, "feed_etag": None, "feed_last_modified": None})
+            self._persist()
+
+        # 前回セッションの検証子を共有キャッシュへ引き継ぐ
+        for feed_id, (etag, last_modified) in self.validators.items():
+            self.bot.feeds.seed_validators(feed_id, etag, last_modified)
+
+        self._reindex()
+        # 購読されていないフィードの投稿時刻モデル（スナップショット由来）を破棄する
+        for feed_id in [f for f in self.models if f not in self.by_feed]:
+            del self.models[feed_id]
+        self.active = True
+
+    async def cog_unload(self):
+        if self._activation is not None:
+            self._activation.cancel()
+            self._activation = None
+        self.bot.snapshots.unregister("yt_upload_models")
+        # 実行中のポーリングの通知・既読更新を終えてから状態ストアの最終書き込みへ進む
+        await self.scheduler.stop()
+        if self.websub is not None:
+            await self.websub.stop()
+
+    # --- 適応ポーリング ---
+    def _model(self, feed_id):
+        model = self.models.get(feed_id)
+        if model is None:
+            model = self.models[feed_id] = UploadModel(self.min_interval, self.max_interval, self.scheduler.interval)
+        return model
+
+    def _dump_models(self):
+        return {feed_id: data for feed_id, model in self.models.items() if (data := model.dump()) is not None}
+
+    def _restore_models(self, data):
+        # 購読テーブルの読み込み前に呼ばれるため、未購読フィードの分は _activate で破棄する
+        for feed_id, item in data.items():
+            self._model(feed_id).restore(item)
+
+    def _interval_for(self, feed_id):
+        model = self.models.get(feed_id)
+        return model.next_interval() if model is not None else self.scheduler.interval
+
+    # --- 購読テーブル管理 ---
+    def _put_subscription(self, feed_id, guild_id, channel_id, role_id, previous=None):
+        key = f"{feed_id}:{channel_id}"
+        sub = {
+            "feed_id": feed_id,
+            "guild_id": str(guild_id) if guild_id else None,
+            "channel_id": str(channel_id),
+            "role_id": str(role_id) if role_id else None
         }
-        url = f"https://api.github.com/gists/{self.gist_id}"
+        # 既読集合は引き継ぐ（未設定なら初回ポーリング時に現在のフィードで初期化）
+        for field in ("seen", "last_video_id"):
+            if previous and previous.get(field):
+                sub[field] = previous[field]
+        self.subscriptions[key] = sub
+        return key
 
-        try:
-            if action == "load":
-                response = requests.get(url, headers=headers, timeout=15)
-                if response.status_code == 200:
-                    files = response.json().get("files", {})
-                    if self.filename in files:
-                        content = files[self.filename].get("content", "{}")
-                        self.data_cache.update(json.loads(content))
-                        print(f"[INFO] Rb m/26S: Data recovered from Gist.")
-                return self.data_cache
-
-            elif action == "save" and new_data:
-                self.data_cache.update(new_data)
-                self.data_cache["last_updated"] = datetime.now().isoformat()
-                
-                payload = {
-                    "files": {
-                        self.filename: {
-                            "content": json.dumps(self.data_cache, indent=4, ensure_ascii=False)
-                        }
-                    }
-                }
-                res = requests.patch(url, headers=headers, json=payload, timeout=15)
-                if res.status_code == 200:
-                    print(f"[INFO] Rb m/26S: Persistent memory updated.")
-                else:
-                    print(f"[ERROR] Rb m/26S Sync Failed: {res.status_code}")
+    def _seen_index(self, key, sub, entries):
+        """購読の既読集合を返す。未初期化なら現在のフィードを既読として登録する"""
+        index = self.seen.get(key)
+        if index is not None:
+            return index, False
 
-        except Exception as e:
-            print(f"[ERROR] Rb m/26S Protocol Exception: {e}")
+        if "seen" in sub:
+            index = SeenIndex.load(sub["seen"])
+            self.seen[key] = index
+            return index, False
+
+        # 新規購読は現在のフィードを通知せず既読化する。
+        # 旧形式の last_video_id があれば、それより新しい動画だけを未読として残す。
+        ids = [entry.video_id for entry in entries]
+        last_video_id = sub.pop("last_video_id", None)
+        if last_video_id in ids:
+            ids = ids[ids.index(last_video_id):]
+        index = SeenIndex(reversed(ids))
+        self.seen[key] = index
+        sub["seen"] = index.dump()
+        return index, True
+
+    def _reindex(self):
+        by_feed = {}
+        for key, sub in self.subscriptions.items():
+            by_feed.setdefault(sub["feed_id"], []).append(key)
+        removed = set(self.by_feed) - set(by_feed)
+        self.by_feed = by_feed
+        for key in list(self.seen):
+            if key not in self.subscriptions:
+                del self.seen[key]
+
+        for feed_id in by_feed:
+            self.scheduler.add(feed_id)
+        for feed_id in removed:
+            self.scheduler.remove(feed_id)
+            self._feed_locks.pop(feed_id, None)
+            self.models.pop(feed_id, None)
+
+        if self.websub is not None:
+            for feed_id in by_feed:
+                self.websub.watch(feed_id)
+            for feed_id in removed:
+                self.websub.unwatch(feed_id)
+        for feed_id in list(self.validators):
+            if feed_id not in by_feed:
+                del self.validators[feed_id]
+
+    def _persist(self):
+        self.bot.state.update({"yt_subscriptions": self.subscriptions, "yt_feed_validators": self.validators})
+
+    def _guild_subscriptions(self, guild):
+        for key, sub in self.subscriptions.items():
+            if sub["guild_id"] == str(guild.id) or guild.get_channel(int(sub["channel_id"])):
+                yield key, sub
+
+    # --- 通知 ---
+    def _build_announcement(self, entry):
+        video_id = entry.video_id
+        video_url = entry.link
+
+        # --- 埋め込みメッセージ構築 (Rb m/26S Standard) ---
+        summary = re.sub('<[^<]+?>', '', entry.summary)
+        summary = (summary[:110] + '...') if len(summary) > 110 else (summary or "No description.")
+
+        embed = discord.Embed(
+            title=f"📽️ {entry.title}",
+            url=video_url,
+            description=(
+                f"**{entry.author}** が新しい動画を公開しました\n"
+                f"━━━━━━━━━━━━━━━━━━━━━━\n"
+                f"**【 概要 】**\n"
+                f"```text\n{summary}\n```"
+            ),
+            color=self.yt_red,
+            timestamp=datetime.now()
+        )
         
-        return self.data_cache
+        # チャンネルアイコンを動的に取得
+        icon_url = f"https://www.google.com/s2/favicons?sz=128&domain_url={entry.author_url}"
+        embed.set_author(name="YouTube Update", icon_url=icon_url)
+        embed.set_image(url=f"https://img.youtube.com/vi/{video_id}/maxresdefault.jpg")
+        embed.set_footer(text="Rb m/26S Broadcaster • Mizunori.TDB")
+
+        view = discord.ui.View()
+        view.add_item(discord.ui.Button(label="動画を見る", style=discord.ButtonStyle.link, url=video_url, emoji="▶️"))
+        return embed, view
+
+    async def _get_channel(self, channel_id):
+        channel = self.bot.get_channel(int(channel_id))
+        if not channel:
+            channel = await self.bot.fetch_channel(int(channel_id))
+        return channel
+
+    async def _dispatch(self, feed_id, keys, entries, seed=True):
+        """未通知のエントリを購読ごとに公開順で送信する。戻り値は (変更あり, 全件送信成功)"""
+        lock = self._feed_locks.setdefault(feed_id, asyncio.Lock())
+        async with lock:
+            announcements = {}
+            changed = False
+            delivered = True
+
+            for key in keys:
+                sub = self.subscriptions.get(key)
+                if sub is None:
+                    continue
+                if not seed and key not in self.seen and "seen" not in sub:
+                    # 既読集合が未初期化の購読は、完全なフィードを取得するポーリングに任せる
+                    self.scheduler.poll_now(feed_id)
+                    continue
+                index, seeded = self._seen_index(key, sub, entries)
+                changed |= seeded
+
+                new_entries = [entry for entry in entries if entry.video_id not in index]
+                if not new_entries:
+                    continue
+                try:
+                    channel = await self._get_channel(sub["channel_id"])
+                    mention = f"<@&{sub['role_id']}>" if sub.get("role_id") else ""
+
+                    for entry in sorted(reversed(new_entries), key=lambda e: e.published):
+                        if entry.video_id not in announcements:
+                            announcements[entry.video_id] = self._build_announcement(entry)
+                        embed, view = announcements[entry.video_id]
+                        await channel.send(content=mention, embed=embed, view=view)
+
+                        index.add(entry.video_id)
+                        sub["seen"] = index.dump()
+                        changed = True
 
-    @tasks.loop(minutes=5)
-    async def monitor_loop(self):
-        """YouTube監視・通知・同期の統合サイクル"""
+                    if not sub.get("guild_id") and getattr(channel, "guild", None):
+                        sub["guild_id"] = str(channel.guild.id)
+                except Exception as e:
+                    delivered = False
+                    logger.error("Announcement Failed (%s): %s", key, e)
+
+            return changed, delivered
+
+    async def on_push(self, feed_id, feed):
+        """WebSubでプッシュされたエントリを即座に通知する"""
         await self.bot.wait_until_ready()
 
-        # 1. ロードプロトコル
-        data = await asyncio.to_thread(self.sync_gist, "load")
-        target_channel_id = data.get("channel_id")
-        last_notified_id = data.get("last_video_id", "")
+        keys = self.by_feed.get(feed_id)
+        if not keys:
+            return
+
+        # 古い動画の編集通知は無視する（既読集合から退避済みでも再通知しない）
+        cutoff = datetime.now(timezone.utc) - timedelta(days=2)
+        entries = []
+        for entry in feed.entries:
+            try:
+                if datetime.fromisoformat(entry.published) < cutoff:
+                    continue
+            except ValueError:
+                continue
+            entries.append(entry)
+
+        if entries:
+            changed, _ = await self._dispatch(feed_id, keys, entries, seed=False)
+            if changed:
+                self._persist()
 
-        if not target_channel_id:
+    async def poll_feed(self, feed_id):
+        """1フィード分の監視・通知・同期サイクル（購読数に関わらず取得は1回）"""
+        await self.bot.wait_until_ready()
+
+        keys = self.by_feed.get(feed_id)
+        if not keys:
             return
 
         try:
-            # 2. RSSスキャン
-            feed = await asyncio.to_thread(feedparser.parse, self.rss_url)
+            # 1. RSSスキャン（共有キャッシュ経由の条件付きGET）
+            # セッション最初の取得は投稿時刻モデルの学習のため本文ごと取得する
+            self.poll_stats["polls"] += 1
+            result = await self.bot.feeds.refresh(feed_id, conditional=self._model(feed_id).trained)
+            if result.modified:
+                self.poll_stats["modified"] += 1
+            else:
+                # 未更新：ヘッダーのみの応答なのでXMLのパースは行わない
+                self.poll_stats["not_modified"] += 1
+
+            feed = result.feed
+            if result.modified and feed:
+                self._model(feed_id).observe(feed.entries)
+            else:
+                self._model(feed_id).record_quiet()
             if not feed or not feed.entries:
                 return
 
-            latest = feed.entries[0]
-            video_id = latest.yt_videoid
-            video_url = latest.link
-
-            # 3. 新着判定
-            if video_id != last_notified_id:
-                channel = self.bot.get_channel(int(target_channel_id))
-                if not channel:
-                    channel = await self.bot.fetch_channel(int(target_channel_id))
-
-                # --- 埋め込みメッセージ構築 (Rb m/26S Standard) ---
-                summary = re.sub('<[^<]+?>', '', latest.summary) if hasattr(latest, 'summary') else ""
-                summary = (summary[:110] + '...') if len(summary) > 110 else (summary or "No description.")
-
-                embed = discord.Embed(
-                    title=f"📽️ {latest.title}",
-                    url=video_url,
-                    description=(
-                        f"**{latest.author}** が新しい動画を公開しました\n"
-                        f"━━━━━━━━━━━━━━━━━━━━━━\n"
-                        f"**【 概要 】**\n"
-                        f"```text\n{summary}\n```"
-                    ),
-                    color=self.yt_red,
-                    timestamp=datetime.now()
-                )
-                
-                # チャンネルアイコンを動的に取得
-                icon_url = f"https://www.google.com/s2/favicons?sz=128&domain_url={latest.author_detail.href}"
-                embed.set_author(name="YouTube Update", icon_url=icon_url)
-                embed.set_image(url=f"https://img.youtube.com/vi/{video_id}/maxresdefault.jpg")
-                embed.set_footer(text="Rb m/26S Broadcaster • Mizunori.TDB")
-
-                view = discord.ui.View()
-                view.add_item(discord.ui.Button(label="動画を見る", style=discord.ButtonStyle.link, url=video_url, emoji="▶️"))
-
-                role_id = data.get("role_id")
-                mention = f"<@&{role_id}>" if role_id else ""
-                
-                # 送信
-                await channel.send(content=mention, embed=embed, view=view)
-
-                # 4. セーブプロトコル（IDを即座に永続化）
-                await asyncio.to_thread(self.sync_gist, "save", {"last_video_id": video_id})
+            # 2. 購読ごとに全エントリを既読集合と突き合わせ、未通知分を公開順に送信
+            changed, delivered = await self._dispatch(feed_id, keys, feed.entries)
+
+            # 3. セーブプロトコル（通知まで完了したフィードのみ検証子を保存）
+            if delivered:
+                validators = list(self.bot.feeds.validators(feed_id))
+                if self.validators.get(feed_id) != validators:
+                    self.validators[feed_id] = validators
+                    changed = True
+            if changed:
+                self._persist()
+
+        except Exception as e:
+            self.poll_stats["errors"] += 1
+            logger.error("Monitor Cycle Aborted (%s): %s", feed_id, e)
+
+    @app_commands.command(name="admin-yt-status", description="YouTube監視の購読一覧とポーリング統計を表示します。")
+    @app_commands.checks.has_permissions(administrator=True)
+    async def status(self, interaction: discord.Interaction):
+        """管理用：購読状況と条件付きGETの効果（304応答率）を表示"""
+        stats = self.poll_stats
+        ratio = (stats["not_modified"] / stats["polls"] * 100) if stats["polls"] else 0.0
+
+        embed = discord.Embed(title="📊 監視プロトコル 統計", color=self.yt_red, timestamp=datetime.now())
+        embed.add_field(name="FEEDS / SUBS", value=f"```\n{len(self.by_feed)} / {len(self.subscriptions)}\n```", inline=True)
+        embed.add_field(name="POLLS", value=f"```\n{stats['polls']}\n```", inline=True)
+        embed.add_field(name="304 NOT MODIFIED", value=f"```\n{stats['not_modified']} ({ratio:.1f}%)\n```", inline=True)
+        embed.add_field(name="200 / ERRORS", value=f"```\n{stats['modified']} / {stats['errors']}\n```", inline=True)
+        if self.websub is not None:
+            push = self.websub.stats
+            embed.add_field(name="PUSH (WebSub)", value=f"```\n{push['notifications']} received / {push['rejected']} rejected\n```", inline=True)
+
+        lines = []
+        for _, sub in self._guild_subscriptions(interaction.guild):
+            due = self.scheduler.next_due(sub["feed_id"])
+            next_poll = f"{int(due)}s" if due is not None else "-"
+            model = self.models.get(sub["feed_id"])
+            latency = model.expected_latency() if model is not None else None
+            expected = f", E[latency]: {int(latency)}s" if latency is not None and self.websub is None else ""
+            lines.append(f"`{sub['feed_id']}` → <#{sub['channel_id']}> (next: {next_poll}{expected})")
+        embed.add_field(name="SUBSCRIPTIONS", value=_fit_field(lines), inline=False)
 
+        embed.set_footer(text="Rb m/26S Broadcaster • Mizunori.TDB")
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    @app_commands.command(name="admin-yt-subscribe", description="YouTubeチャンネルの新着通知を購読します。")
+    @app_commands.describe(youtube_channel_id="YouTubeチャンネルID (UC...)", channel="通知先のテキストチャンネル", role="メンションするロール（任意）")
+    @app_commands.checks.has_permissions(administrator=True)
+    async def subscribe(self, interaction: discord.Interaction, youtube_channel_id: str, channel: discord.TextChannel, role: discord.Role = None):
+        """管理用：購読の追加"""
+        if not self.active:
+            return await interaction.response.send_message(STATE_NOT_READY, ephemeral=True)
+        feed_id = youtube_channel_id.strip()
+        if not CHANNEL_ID_PATTERN.match(feed_id):
+            return await interaction.response.send_message("⚠️ YouTubeチャンネルIDの形式が正しくありません（UC で始まる24文字）。", ephemeral=True)
+
+        await interaction.response.send_message("🔄 **Gist Persistence Protocol: 同期中...**", ephemeral=True)
+        try:
+            await self._apply_subscription(interaction, feed_id, channel, role)
         except Exception as e:
-            print(f"[ERROR] Monitor Cycle Aborted: {e}")
+            await interaction.edit_original_response(content=f"⚠️ 構成失敗: {e}")
+
+    @app_commands.command(name="admin-yt-unsubscribe", description="YouTubeチャンネルの新着通知の購読を解除します。")
+    @app_commands.describe(youtube_channel_id="YouTubeチャンネルID (UC...)", channel="解除する通知先（省略時はこのサーバーの全通知先）")
+    @app_commands.checks.has_permissions(administrator=True)
+    async def unsubscribe(self, interaction: discord.Interaction, youtube_channel_id: str, channel: discord.TextChannel = None):
+        """管理用：購読の削除"""
+        if not self.active:
+            return await interaction.response.send_message(STATE_NOT_READY, ephemeral=True)
+        feed_id = youtube_channel_id.strip()
+        removed = [
+            key for key, sub in self._guild_subscriptions(interaction.guild)
+            if sub["feed_id"] == feed_id and (channel is None or sub["channel_id"] == str(channel.id))
+        ]
+        if not removed:
+            return await interaction.response.send_message("⚠️ 該当する購読が見つかりません。", ephemeral=True)
+
+        for key in removed:
+            del self.subscriptions[key]
+        self._reindex()
+        self._persist()
+        await interaction.response.send_message(f"✅ {len(removed)} 件の購読を解除しました。", ephemeral=True)
+
+    async def _apply_subscription(self, interaction, feed_id, channel, role):
+        key = f"{feed_id}:{channel.id}"
+        self._put_subscription(feed_id, interaction.guild.id, channel.id, role.id if role else None,
+                               previous=self.subscriptions.get(key))
+        self._reindex()
+
+        # 設定をGistへ強制書き込み
+        self._persist()
+        await self.bot.state.flush()
+
+        embed = discord.Embed(
+            title="📡 監視プロトコル リンク完了",
+            description=(
+                "YouTube監視システムが正常に構成されました。\n"
+                "データはGist外部メモリに永続化されています。"
+            ),
+            color=0x2ECC71
+        )
+        embed.add_field(name="FEED", value=f"`{feed_id}`", inline=False)
+        embed.add_field(name="TARGET", value=channel.mention, inline=True)
+        embed.add_field(name="ROLE", value=role.mention if role else "None", inline=True)
+        embed.set_footer(text="Mizunori.TDB System Integrated")
+
+        await interaction.edit_original_response(content=None, embed=embed)
+        self.scheduler.poll_now(feed_id)
 
     @app_commands.command(name="admin-yt-setup", description="YouTube通知システムを構成し、Gistとリンクします。")
     @app_commands.describe(channel="通知先のテキストチャンネル", role="メンションするロール（任意）")
     @app_commands.checks.has_permissions(administrator=True)
     async def setup(self, interaction: discord.Interaction, channel: discord.TextChannel, role: discord.Role = None):
-        """管理用：通知システムの永続構成プロトコル"""
+        """管理用：既定チャンネルの通知システムの永続構成プロトコル"""
+        if not self.active:
+            return await interaction.response.send_message(STATE_NOT_READY, ephemeral=True)
         await interaction.response.send_message("🔄 **Gist Persistence Protocol: 同期中...**", ephemeral=True)
         
         try:
-            role_id = role.id if role else None
-            # 設定をGistへ強制書き込み
-            new_config = {
-                "channel_id": str(channel.id),
-                "role_id": str(role_id) if role_id else None
-            }
-            await asyncio.to_thread(self.sync_gist, "save", new_config)
-            
-            embed = discord.Embed(
-                title="📡 監視プロトコル リンク完了",
-                description=(
-                    "YouTube監視システムが正常に構成されました。\n"
-                    "データはGist外部メモリに永続化されています。"
-                ),
-                color=0x2ECC71
-            )
-            embed.add_field(name="TARGET", value=channel.mention, inline=True)
-            embed.add_field(name="ROLE", value=role.mention if role else "None", inline=True)
-            embed.set_footer(text="Mizunori.TDB System Integrated")
-            
-            await interaction.edit_original_response(content=None, embed=embed)
-            self.monitor_loop.restart()
-
+            await self._apply_subscription(interaction, self.channel_id, channel, role)
         except Exception as e:
             await interaction.edit_original_response(content=f"⚠️ 構成失敗: {e}")
 
@@ -1,9 +1,6 @@
 import discord
 from discord import app_commands
 from discord.ext import commands
-import feedparser
-import asyncio
-import re
 from datetime import datetime
 
 class YouTubeChannel(commands.Cog):
@@ -11,7 +8,6 @@ class YouTubeChannel(commands.Cog):
         self.bot = bot
         self.google_blue = 0x4285F4
         self.channel_id = "UC1owxxoNexXWbJ-ri7r5-ww"
-        self.rss_url = f"https://www.youtube.com/feeds/videos.xml?channel_id={self.channel_id}"
         self.channel_url = f"https://www.youtube.com/channel/{self.channel_id}"
 
     @app_commands.command(
@@ -21,17 +17,19 @@ class YouTubeChannel(commands.Cog):
     async def channel_guide(self, interaction: discord.Interaction):
         """最新の登録者数やアイコンを動的に取得して表示します。"""
         
-        # 1. 処理中メッセージ
-        process_embed = discord.Embed(
-            description="🔄 **System: YouTubeデータベースから最新情報を照会中...**",
-            color=self.google_blue
-        )
-        await interaction.response.send_message(embed=process_embed)
-
         try:
+            # 1. 共有キャッシュから即座に取得（TTL切れなら裏で再取得）
+            feed = self.bot.feeds.get_nowait(self.channel_id)
+            if feed is None:
+                # キャッシュ未取得時のみ処理中メッセージを出して取得を待つ
+                process_embed = discord.Embed(
+                    description="🔄 **System: YouTubeデータベースから最新情報を照会中...**",
+                    color=self.google_blue
+                )
+                await interaction.response.send_message(embed=process_embed)
+                feed = await self.bot.feeds.get(self.channel_id)
+
             # 2. RSSフィードから基本情報の取得
-            feed = await asyncio.to_thread(feedparser.parse, self.rss_url)
-            
             if not feed.entries:
                 channel_name = "ゆっくりジョナサン" # フォールバック
                 latest_video_title = "取得できませんでした"
@@ -90,12 +88,18 @@ class YouTubeChannel(commands.Cog):
             view.add_item(discord.ui.Button(label="YouTubeで開く", style=discord.ButtonStyle.link, url=self.channel_url, emoji="🚀"))
             view.add_item(discord.ui.Button(label="最新の動画を見る", style=discord.ButtonStyle.link, url=feed.entries[0].link if feed.entries else self.channel_url, emoji="🎞️"))
 
-            # 5. レポートへ更新
-            await interaction.edit_original_response(content=None, embed=embed, view=view)
+            # 5. レポートを送信（処理中メッセージを出していれば更新）
+            if interaction.response.is_done():
+                await interaction.edit_original_response(content=None, embed=embed, view=view)
+            else:
+                await interaction.response.send_message(embed=embed, view=view)
 
         except Exception as e:
             error_embed = discord.Embed(description=f"⚠️ **データ照会エラー:** `{e}`", color=0xFF0000)
-            await interaction.edit_original_response(content=None, embed=error_embed)
+            if interaction.response.is_done():
+                await interaction.edit_original_response(content=None, embed=error_embed)
+            else:
+                await interaction.response.send_message(embed=error_embed)
 
 async def setup(bot):
     await bot.add_cog(YouTubeChannel(bot))
@@ -1,42 +1,39 @@
+import time
+_BOOT_STARTED = time.perf_counter()
+
 import discord # タイポ修正：Import -> import
 from discord.ext import commands
 import os
 import asyncio
+import hashlib
+import json
 import logging
-import logging.handlers
 from datetime import datetime
 import pytz
 
-# 1. 高度なロギング設定
+from utils.feed_cache import FeedCache
+from utils.http_client import HttpClient
+from utils.log_pipeline import setup_logging
+from utils.loop_watchdog import LoopWatchdog
+from utils.member_lru import MemberLRU
+from utils.metrics import MetricsRegistry
+from utils.snapshot import SnapshotStore
+from utils.state_store import StateStore
+
+_IMPORTS_DONE = time.perf_counter()
+
+# 1. 高度なロギング設定（キュー経由でリスナースレッドが出力する。LOG_FORMAT=json で構造化ログ）
 if not os.path.exists('logs'):
     os.makedirs('logs')
 
-formatter = logging.Formatter(
-    fmt='[{asctime}] [{levelname:<8}] {name}: {message}',
-    datefmt='%Y-%m-%d %H:%M:%S',
-    style='{'
-)
-
-console_handler = logging.StreamHandler()
-console_handler.setFormatter(formatter)
-console_handler.setLevel(logging.INFO)
-
-file_handler = logging.handlers.RotatingFileHandler(
-    filename='logs/system.log',
-    encoding='utf-8',
-    maxBytes=5 * 1024 * 1024,
-    backupCount=5
-)
-file_handler.setFormatter(formatter)
-file_handler.setLevel(logging.DEBUG)
-
+log_listener = setup_logging('logs/system.log', json_output=os.getenv("LOG_FORMAT") == "json")
 logger = logging.getLogger()
-logger.setLevel(logging.INFO)
-logger.addHandler(console_handler)
-logger.addHandler(file_handler)
 
 logging.getLogger('discord').setLevel(logging.WARNING)
 
+# 拡張機能の依存関係 {拡張名: (先に読み込む拡張名, ...)}。記載の無い拡張は並行して読み込む
+EXTENSION_DEPENDENCIES = {}
+
 
 class SwedishTechBot(commands.Bot):
     def __init__(self):
@@ -47,41 +44,189 @@ class SwedishTechBot(commands.Bot):
         intents.invites = True         
         intents.presences = True       # ★重要：ステータスやアクティビティ取得に必須
 
+        # 3. メンバーキャッシュ方針（MEMBER_CACHE_POLICY=lean で起動時チャンク取得を省略し、
+        #    ライブラリのメンバーキャッシュを無効化して最近のメンバーのみLRUで保持する）
+        self.lean_member_cache = os.getenv("MEMBER_CACHE_POLICY", "full") == "lean"
+        cache_options = {}
+        if self.lean_member_cache:
+            cache_options = dict(
+                chunk_guilds_at_startup=False,
+                member_cache_flags=discord.MemberCacheFlags.none()
+            )
+
         super().__init__(
             command_prefix="!", 
             intents=intents,
-            help_command=None   
+            help_command=None,
+            **cache_options
         )
         self.jst = pytz.timezone('Asia/Tokyo')
 
+        # 共有メトリクス（カウンタ・ヒストグラム）。公開は cogs/metrics.py が担当
+        self.metrics = MetricsRegistry()
+
+        # イベントループの遅延監視（LOOP_STALL_THRESHOLD 秒以上のブロックでスタックを記録）
+        self.watchdog = LoopWatchdog(
+            threshold=float(os.getenv("LOOP_STALL_THRESHOLD", "0.5")),
+            histogram=self.metrics.histogram("event_loop_lag_seconds", "Event loop scheduling lag")
+        )
+
+        # ボット全体で共有するHTTPコネクションプールとGist状態ストア
+        self.web = HttpClient(metrics=self.metrics)
+        self.state = StateStore(self.web, os.getenv("GIST_ID"), os.getenv("GIST_TOKEN"))
+        # YouTube RSSの共有キャッシュ（監視ループと /yt-channel で共用）
+        self.feeds = FeedCache(self.web, ttl=float(os.getenv("FEED_CACHE_TTL", "300")))
+
+        # 最近見かけたメンバー（軽量キャッシュモードで /user がプレゼンス付きで再利用する）
+        self.recent_members = MemberLRU(
+            capacity=int(os.getenv("MEMBER_LRU_SIZE", "2048")),
+            ttl=float(os.getenv("MEMBER_LRU_TTL", "300"))
+        )
+
+        # 再起動を跨ぐキャッシュのスナップショット（ゲートウェイ接続前に復元、Gistへも複製）
+        self.snapshots = SnapshotStore(
+            os.getenv("SNAPSHOT_PATH", "cache/snapshot.bin"),
+            interval=float(os.getenv("SNAPSHOT_INTERVAL", "600")),
+            remote=self.state
+        )
+
+        # 起動フェーズ別の所要時間（秒）
+        self.boot_timings = {}
+        self._connect_started = None
+
     async def setup_hook(self):
         """起動時の初期化処理"""
+        self.boot_timings["imports"] = _IMPORTS_DONE - _BOOT_STARTED
+        self.watchdog.start()
+
+        phase = time.perf_counter()
+        await self.web.start()
+
+        logger.info("Loading persistent state...")
+        await self.state.load()
+        await self.snapshots.load()
+        self.snapshots.register("feed_cache", self.feeds.dump, self.feeds.restore, max_age=86400)
+        self.boot_timings["state"] = time.perf_counter() - phase
+
         logger.info("Initializing system modules...")
-        
+
+        phase = time.perf_counter()
         loaded_cogs = 0
         if os.path.exists('./cogs'):
-            for filename in os.listdir('./cogs'):
-                if filename.endswith('.py'):
-                    try:
-                        await self.load_extension(f'cogs.{filename[:-3]}')
-                        logger.info(f'Module Loaded: {filename}')
-                        loaded_cogs += 1
-                    except Exception as e:
-                        logger.error(f'Failed to load extension {filename}: {e}', exc_info=True)
+            names = sorted(f'cogs.{filename[:-3]}' for filename in os.listdir('./cogs') if filename.endswith('.py'))
+            loaded_cogs = await self._load_extensions(names)
         else:
             logger.warning("'cogs' directory not found.")
+        self.boot_timings["extensions"] = time.perf_counter() - phase
+        self.snapshots.start()
 
         logger.info("Syncing application commands...")
+        phase = time.perf_counter()
+        await self._sync_commands()
+        self.boot_timings["command_sync"] = time.perf_counter() - phase
+
+        logger.info(f"Setup complete. {loaded_cogs} modules loaded.")
+        self._connect_started = time.perf_counter()
+
+    async def _load_extensions(self, names):
+        """依存関係の順序を守りつつ拡張機能を並行して読み込み、成功数を返す（依存は非循環であること）"""
+        tasks = {}
+
+        async def load(name):
+            for dep in EXTENSION_DEPENDENCIES.get(name, ()):
+                if dep not in tasks:
+                    logger.warning(f"Extension {name} depends on {dep}, which is not present.")
+                elif not await tasks[dep]:
+                    logger.error(f"Skipped extension {name}: dependency {dep} failed to load.")
+                    return False
+
+            started = time.perf_counter()
+            try:
+                await self.load_extension(name)
+            except Exception as e:
+                logger.error(f'Failed to load extension {name}: {e}', exc_info=True)
+                return False
+            self.boot_timings[f"ext:{name}"] = time.perf_counter() - started
+            logger.info(f'Module Loaded: {name}')
+            return True
+
+        for name in names:
+            tasks[name] = asyncio.create_task(load(name))
+        return sum(await asyncio.gather(*tasks.values()))
+
+    async def _command_tree_hash(self, guild=None):
+        """同期時と同じペイロード（名前・オプション・権限・ローカライズ）から安定したハッシュを作る"""
+        commands = self.tree.get_commands(guild=guild)
+        translator = self.tree.translator
+        if translator:
+            payload = [await command.get_translated_payload(self.tree, translator) for command in commands]
+        else:
+            payload = [command.to_dict(self.tree) for command in commands]
+        payload.sort(key=lambda c: (c.get("type", 1), c["name"]))
+
+        raw = json.dumps({"application_id": self.application_id, "commands": payload},
+                         sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    async def _sync_commands(self):
+        """コマンド定義が前回の同期から変わった場合のみ tree.sync() を呼ぶ
+
+        DEV_GUILD_ID を設定すると開発用にそのギルドへのみ同期する（ギルドコマンドは即時反映）。
+        FORCE_COMMAND_SYNC=1 でハッシュに関係なく同期する。
+        """
+        dev_guild = os.getenv("DEV_GUILD_ID")
+        guild = discord.Object(id=int(dev_guild)) if dev_guild else None
+        if guild is not None:
+            self.tree.copy_global_to(guild=guild)
+
+        scope = str(guild.id) if guild is not None else "global"
+        digest = await self._command_tree_hash(guild)
+        hashes = dict(self.state.get("command_tree_hashes", {}))
+
+        if hashes.get(scope) == digest and os.getenv("FORCE_COMMAND_SYNC") != "1":
+            logger.info(f"Command tree unchanged ({scope}, {digest[:12]}). Skipping sync.")
+            return
+
         try:
-            synced = await self.tree.sync()
-            logger.info(f'Command Tree Synced: {len(synced)} commands active.')
+            synced = await self.tree.sync(guild=guild)
+            logger.info(f'Command Tree Synced ({scope}): {len(synced)} commands active.')
         except Exception as e:
             logger.error(f'Failed to sync command tree: {e}', exc_info=True)
-        
-        logger.info(f"Setup complete. {loaded_cogs} modules loaded.")
+            return
+
+        # 同期に成功した時だけハッシュを記録する（失敗時は次回起動で再試行）
+        hashes[scope] = digest
+        self.state.update({"command_tree_hashes": hashes})
+
+    def _log_boot_timings(self):
+        """起動フェーズごとの所要時間を出力する（再起動の停止時間の内訳）"""
+        total = time.perf_counter() - _BOOT_STARTED
+        logger.info(f"Startup profile ({total:.2f}s total):")
+        for phase, seconds in self.boot_timings.items():
+            logger.info(f"  {phase:<32} {seconds * 1000:8.1f} ms")
+
+    async def close(self):
+        """終了時にキャッシュのスナップショットを保存し、未反映の状態をGistへ書き戻してから切断する"""
+        await self.snapshots.close()
+        # フィード監視などのCogを先に停止し、停止までに行われた書き込みも含めて反映する
+        for name in list(self.extensions):
+            try:
+                await self.unload_extension(name)
+            except Exception as e:
+                logger.error("Failed to unload %s: %s", name, e)
+        logger.info("Flushing persistent state...")
+        await self.state.close()
+        await self.web.close()
+        await self.watchdog.stop()
+        await super().close()
 
     async def on_ready(self):
         """ボット起動完了時のイベント"""
+        if self._connect_started is not None:
+            self.boot_timings["gateway_connect"] = time.perf_counter() - self._connect_started
+            self._connect_started = None
+            self._log_boot_timings()
+
         # ステータス: 退席中 (Idle) / メッセージ: "Made by Mizunori.TDB"
         await self.change_presence(
             status=discord.Status.idle,
@@ -114,4 +259,6 @@ if __name__ == '__main__':
         logger.info("System shutdown requested by user.")
     except Exception as e:
         logger.critical(f"Fatal error: {e}", exc_info=True)
+    finally:
+        log_listener.stop()
 
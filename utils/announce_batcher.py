@@ -0,0 +1,59 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class AnnouncementBatcher:
+    """チャンネル単位で埋め込みをまとめて送信するパイプライン
+
+    投入された埋め込みは flush_delay 秒待ってから、1メッセージあたり最大
+    max_embeds 件に詰めて送信する。待ち行列が summary_threshold 件を超えた場合は
+    build_summary(lines) で作るコンパクトな一覧埋め込みへ切り替える。
+    送信はチャンネルごとに直列化され、送信数はバースト規模に対して有界に保たれる。
+    """
+
+    def __init__(self, build_summary, flush_delay=1.0, max_embeds=10, summary_threshold=30, summary_lines=40):
+        self.build_summary = build_summary
+        self.flush_delay = flush_delay
+        self.max_embeds = max_embeds
+        self.summary_threshold = summary_threshold
+        self.summary_lines = summary_lines
+        self._queues = {}   # {channel_id: [(embed, line), ...]}
+        self._workers = {}
+
+    def submit(self, channel, embed, line):
+        """埋め込みと、要約モード用の1行表記を投入する"""
+        self._queues.setdefault(channel.id, []).append((embed, line))
+        if channel.id not in self._workers:
+            self._workers[channel.id] = asyncio.create_task(self._drain(channel))
+
+    def _pack(self, embeds):
+        """1メッセージの上限（埋め込み10件・合計6000文字）に収まるよう分割する"""
+        batch, size = [], 0
+        for embed in embeds:
+            if batch and (len(batch) >= self.max_embeds or size + len(embed) > 6000):
+                yield batch
+                batch, size = [], 0
+            batch.append(embed)
+            size += len(embed)
+        if batch:
+            yield batch
+
+    async def _drain(self, channel):
+        try:
+            await asyncio.sleep(self.flush_delay)
+            while self._queues.get(channel.id):
+                queue = self._queues.pop(channel.id)
+                try:
+                    if len(queue) > self.summary_threshold:
+                        for i in range(0, len(queue), self.summary_lines):
+                            lines = [line for _, line in queue[i:i + self.summary_lines]]
+                            await channel.send(embed=self.build_summary(lines))
+                    else:
+                        for embeds in self._pack([embed for embed, _ in queue]):
+                            await channel.send(embeds=embeds)
+                except Exception as e:
+                    logger.error("Announcement delivery to #%s failed: %s", channel, e)
+        finally:
+            self._workers.pop(channel.id, None)
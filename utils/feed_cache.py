@@ -0,0 +1,178 @@
+import asyncio
+import logging
+import time
+
+from utils.yt_feed import Feed, FeedEntry, parse_feed
+
+logger = logging.getLogger(__name__)
+
+FEED_URL = "https://www.youtube.com/feeds/videos.xml?channel_id={channel_id}"
+
+
+class FeedFetchError(Exception):
+    def __init__(self, channel_id, status):
+        super().__init__(f"Feed fetch for {channel_id} failed with HTTP {status}")
+        self.channel_id = channel_id
+        self.status = status
+
+
+class CachedFeed:
+    __slots__ = ("feed", "etag", "last_modified", "fetched_at")
+
+    def __init__(self, feed=None, etag="", last_modified="", fetched_at=0.0):
+        self.feed = feed
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched_at = fetched_at
+
+
+class FeedResult:
+    __slots__ = ("feed", "status")
+
+    def __init__(self, feed, status):
+        self.feed = feed
+        self.status = status
+
+    @property
+    def modified(self):
+        return self.status == 200
+
+
+class FeedCache:
+    """YouTubeチャンネルIDをキーにした共有RSSキャッシュ
+
+    - 同じチャンネルへの同時取得は1回のリクエストにまとめる（single-flight）
+    - TTL切れのデータは即座に返しつつ裏で再取得する（stale-while-revalidate）
+    - ETag / Last-Modified を保持し、再取得は条件付きGETで行う
+    """
+
+    def __init__(self, web, ttl=300.0, max_entries=15):
+        self.web = web
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}
+        self._inflight = {}
+
+    @staticmethod
+    def feed_url(channel_id):
+        return FEED_URL.format(channel_id=channel_id)
+
+    def seed_validators(self, channel_id, etag="", last_modified=""):
+        """永続化された検証子を、本文を持たない状態で登録する"""
+        entry = self._entries.setdefault(channel_id, CachedFeed())
+        if entry.feed is None:
+            entry.etag = etag or ""
+            entry.last_modified = last_modified or ""
+
+    def dump(self):
+        """スナップショット用：本文を持つエントリを {channel_id: {...}} で返す（取得時刻は壁時計）"""
+        offset = time.time() - time.monotonic()
+        data = {}
+        for channel_id, entry in self._entries.items():
+            if entry.feed is None:
+                continue
+            data[channel_id] = {
+                "etag": entry.etag,
+                "last_modified": entry.last_modified,
+                "fetched_at": entry.fetched_at + offset,
+                "title": entry.feed.title,
+                "entries": [[getattr(e, slot) for slot in FeedEntry.__slots__] for e in entry.feed.entries],
+            }
+        return data
+
+    def restore(self, data):
+        """スナップショットから本文と検証子を戻す（TTL判定は元の取得時刻のまま）"""
+        offset = time.time() - time.monotonic()
+        for channel_id, item in data.items():
+            if channel_id in self._entries and self._entries[channel_id].feed is not None:
+                continue
+            entries = []
+            for values in item["entries"][:self.max_entries]:
+                entry = FeedEntry()
+                for slot, value in zip(FeedEntry.__slots__, values):
+                    setattr(entry, slot, value)
+                entries.append(entry)
+            self._entries[channel_id] = CachedFeed(
+                feed=Feed(channel_id, item.get("title", ""), entries),
+                etag=item.get("etag", ""),
+                last_modified=item.get("last_modified", ""),
+                fetched_at=item["fetched_at"] - offset
+            )
+
+    def validators(self, channel_id):
+        entry = self._entries.get(channel_id)
+        if entry is None:
+            return "", ""
+        return entry.etag, entry.last_modified
+
+    def is_fresh(self, channel_id):
+        entry = self._entries.get(channel_id)
+        return bool(entry and entry.feed is not None and time.monotonic() - entry.fetched_at < self.ttl)
+
+    async def _fetch(self, channel_id, conditional):
+        entry = self._entries.get(channel_id)
+        headers = {}
+        if conditional and entry is not None:
+            if entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+
+        res = await self.web.get(self.feed_url(channel_id), headers=headers)
+        now = time.monotonic()
+
+        if res.status == 304 and entry is not None:
+            entry.fetched_at = now
+            return FeedResult(entry.feed, 304)
+        if res.status != 200:
+            raise FeedFetchError(channel_id, res.status)
+
+        # 必要なフィールドのみを抽出する軽量パーサ（15件で1ms程度のためループ上で実行）
+        feed = parse_feed(res.body, self.max_entries)
+        self._entries[channel_id] = CachedFeed(
+            feed=feed,
+            etag=res.headers.get("ETag", ""),
+            last_modified=res.headers.get("Last-Modified", ""),
+            fetched_at=now
+        )
+        return FeedResult(feed, 200)
+
+    def _start_fetch(self, channel_id, conditional=True):
+        task = self._inflight.get(channel_id)
+        if task is None:
+            task = asyncio.create_task(self._fetch(channel_id, conditional))
+            self._inflight[channel_id] = task
+            task.add_done_callback(lambda t: self._fetch_done(channel_id, t))
+        return task
+
+    def _fetch_done(self, channel_id, task):
+        if self._inflight.get(channel_id) is task:
+            del self._inflight[channel_id]
+        # 失敗は呼び出し側（監視ループ）が記録するため、ここでは例外の回収のみ行う
+        if not task.cancelled() and task.exception() is not None:
+            logger.debug("Feed refresh for %s failed: %s", channel_id, task.exception())
+
+    async def refresh(self, channel_id, conditional=True):
+        """フィードを取得する（進行中の取得があれば相乗りする）"""
+        return await asyncio.shield(self._start_fetch(channel_id, conditional))
+
+    def get_nowait(self, channel_id):
+        """キャッシュ済みのフィードを即座に返す。TTL切れなら裏で再取得を開始する"""
+        entry = self._entries.get(channel_id)
+        if entry is None or entry.feed is None:
+            return None
+        if time.monotonic() - entry.fetched_at >= self.ttl:
+            self._start_fetch(channel_id)
+        return entry.feed
+
+    async def get(self, channel_id):
+        """キャッシュがあれば即座に返し、無い場合のみ取得完了を待つ"""
+        feed = self.get_nowait(channel_id)
+        if feed is not None:
+            return feed
+
+        result = await self.refresh(channel_id)
+        if result.feed is None:
+            # 検証子のみ保持していて304が返った場合は本文を取り直す
+            result = await self.refresh(channel_id, conditional=False)
+        return result.feed
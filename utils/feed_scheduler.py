@@ -0,0 +1,133 @@
+import asyncio
+import heapq
+import logging
+import random
+import time
+
+logger = logging.getLogger(__name__)
+
+# 黄金比による低食い違い列：追加順に関わらず位相が周期内へ均等に散らばる
+_GOLDEN = 0.6180339887498949
+
+
+class FeedScheduler:
+    """フィード単位のポーリングを周期内へ均等に分散させるスケジューラ
+
+    各フィードは固有の位相を持ち、interval ごとに（±jitter の揺らぎ付きで）
+    poll(feed_id) が呼ばれる。同時実行数は max_concurrency で制限され、
+    同じフィードは何件の購読があっても1回しか取得されない。
+    interval_for(feed_id) を渡すと、取得完了ごとにフィード別の間隔で再計画する。
+    """
+
+    def __init__(self, poll, interval=300.0, max_concurrency=8, jitter=0.1, interval_for=None):
+        self.poll = poll
+        self.interval = interval
+        self.interval_for = interval_for
+        self.jitter = jitter
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._heap = []
+        self._due = {}
+        self._running = set()
+        self._polls = set()     # 実行中の取得タスク（停止時に完了を待つ）
+        self._counter = 0
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def __contains__(self, feed_id):
+        return feed_id in self._due
+
+    def __len__(self):
+        return len(self._due)
+
+    def _push(self, feed_id, due):
+        self._due[feed_id] = due
+        heapq.heappush(self._heap, (due, feed_id))
+        self._wakeup.set()
+
+    def _next_interval(self, feed_id):
+        interval = self.interval_for(feed_id) if self.interval_for else self.interval
+        spread = interval * self.jitter
+        return interval + random.uniform(-spread, spread)
+
+    def add(self, feed_id):
+        if feed_id in self._due:
+            return
+        phase = (self._counter * _GOLDEN) % 1.0
+        self._counter += 1
+        self._push(feed_id, time.monotonic() + phase * self.interval)
+
+    def remove(self, feed_id):
+        # ヒープ上の古い項目は取り出し時に読み捨てる
+        self._due.pop(feed_id, None)
+
+    def poll_now(self, feed_id):
+        self._push(feed_id, time.monotonic())
+
+    def next_due(self, feed_id):
+        due = self._due.get(feed_id)
+        return None if due is None else max(0.0, due - time.monotonic())
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout=10.0):
+        """ループを止め、実行中の取得の完了を待つ（timeout 秒を過ぎた分は取り消す）"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if not self._polls:
+            return
+        _, pending = await asyncio.wait(set(self._polls), timeout=timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            logger.warning("Cancelled %s feed polls still running at shutdown.", len(pending))
+            await asyncio.wait(pending)
+
+    async def _run(self):
+        while True:
+            if not self._heap:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            due, feed_id = self._heap[0]
+            delay = due - time.monotonic()
+            if delay > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            heapq.heappop(self._heap)
+            if self._due.get(feed_id) != due:
+                continue
+            if feed_id in self._running:
+                # 前回の取得が長引いている場合は今回分を見送る
+                self._push(feed_id, due + self._next_interval(feed_id))
+                continue
+
+            await self._semaphore.acquire()
+            self._running.add(feed_id)
+            # 取得完了時刻ではなく予定時刻を基準にして位相のずれを防ぐ
+            self._push(feed_id, max(due + self._next_interval(feed_id), time.monotonic()))
+            task = asyncio.create_task(self._poll_one(feed_id))
+            self._polls.add(task)
+            task.add_done_callback(self._polls.discard)
+            task.add_done_callback(lambda t, f=feed_id: self._poll_done(f))
+
+    async def _poll_one(self, feed_id):
+        try:
+            await self.poll(feed_id)
+        except Exception as e:
+            logger.error("Feed poll failed for %s: %s", feed_id, e, exc_info=True)
+
+    def _poll_done(self, feed_id):
+        self._running.discard(feed_id)
+        self._semaphore.release()
+        if self.interval_for is not None and feed_id in self._due:
+            # 取得結果を反映した間隔で次回を計画し直す
+            self._push(feed_id, time.monotonic() + self._next_interval(feed_id))
@@ -0,0 +1,124 @@
+import asyncio
+import json
+import logging
+import random
+import time
+from urllib.parse import urlsplit
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+
+class HttpResponse:
+    """本文を読み切った後のレスポンス（コネクションは既にプールへ返却済み）"""
+    __slots__ = ("status", "headers", "body")
+
+    def __init__(self, status, headers, body):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    @property
+    def ok(self):
+        return 200 <= self.status < 300
+
+    def json(self):
+        return json.loads(self.body)
+
+
+class HttpClient:
+    """ボット全体で共有する非同期HTTPクライアント
+
+    1つの aiohttp.ClientSession を使い回し、Keep-Alive でTCP/TLS接続を再利用する。
+    ホスト単位の同時接続数、タイムアウト、指数バックオフ付きのリトライを提供する。
+    """
+
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+    def __init__(self, limit=32, limit_per_host=6, timeout=15, retries=3, backoff=0.5, metrics=None):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.timeout = aiohttp.ClientTimeout(total=timeout, connect=5)
+        self.retries = retries
+        self.backoff = backoff
+        self._session = None
+        self._closed = False
+
+        # ホスト・ステータス別のレイテンシ（リトライは1回ずつ計上し、通信失敗は status="error"）
+        self._latency = None
+        if metrics is not None:
+            self._latency = metrics.histogram("http_request_seconds", "Outbound HTTP request latency", ("host", "status"))
+
+    def _observe(self, url, status, started):
+        if self._latency is not None:
+            self._latency.labels(urlsplit(url).hostname or "-", str(status)).observe(time.perf_counter() - started)
+
+    async def start(self):
+        self._closed = False
+        if self._session is not None and not self._session.closed:
+            return
+        connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            keepalive_timeout=60,
+            ttl_dns_cache=300
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=self.timeout,
+            headers={"User-Agent": "Rb-m26S-Bot (+https://github.com/SK0528JP/rbm26s)"}
+        )
+
+    async def close(self):
+        # 終了後のリクエストで新しいセッションを開き直さない
+        self._closed = True
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def _retry_delay(self, attempt, headers=None):
+        retry_after = headers.get("Retry-After") if headers else None
+        if retry_after:
+            try:
+                return min(float(retry_after), 60.0)
+            except ValueError:
+                pass
+        return self.backoff * (2 ** attempt) + random.uniform(0, self.backoff)
+
+    async def request(self, method, url, *, headers=None, json=None, data=None, retries=None):
+        """リクエストを送信し、本文まで読み込んだ HttpResponse を返す"""
+        if self._closed:
+            raise aiohttp.ClientConnectionError("HTTP client is closed")
+        if self._session is None or self._session.closed:
+            await self.start()
+
+        retries = self.retries if retries is None else retries
+        for attempt in range(retries + 1):
+            started = time.perf_counter()
+            try:
+                async with self._session.request(method, url, headers=headers, json=json, data=data) as res:
+                    body = await res.read()
+                    self._observe(url, res.status, started)
+                    if res.status in self.RETRY_STATUSES and attempt < retries:
+                        delay = self._retry_delay(attempt, res.headers)
+                        logger.warning("%s %s -> %s, retrying in %.1fs", method, url, res.status, delay)
+                        await asyncio.sleep(delay)
+                        continue
+                    return HttpResponse(res.status, res.headers, body)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                self._observe(url, "error", started)
+                if attempt >= retries:
+                    raise
+                delay = self._retry_delay(attempt)
+                logger.warning("%s %s failed (%r), retrying in %.1fs", method, url, e, delay)
+                await asyncio.sleep(delay)
+
+    async def get(self, url, **kwargs):
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        return await self.request("POST", url, **kwargs)
+
+    async def patch(self, url, **kwargs):
+        return await self.request("PATCH", url, **kwargs)
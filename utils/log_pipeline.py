@@ -0,0 +1,109 @@
+import json
+import logging
+import logging.handlers
+import queue
+import time
+from datetime import datetime, timezone
+
+
+class JsonFormatter(logging.Formatter):
+    """1レコード1行のJSON（構造化ログ）"""
+
+    def format(self, record):
+        payload = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            payload["exc_info"] = self.formatException(record.exc_info)
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            payload["suppressed"] = suppressed
+        return json.dumps(payload, ensure_ascii=False)
+
+
+class RateLimitFilter(logging.Filter):
+    """同じ警告・エラーの連発を間引くフィルタ
+
+    (ロガー名, メッセージテンプレート) ごとに window 秒あたり burst 件まで通し、
+    それ以降は捨てて件数だけ数える。次に通過したレコードへ抑制件数を付記する。
+    テンプレートで判定するため、可変部分は f-string ではなく引数で渡すこと。
+    """
+
+    def __init__(self, window=60.0, burst=5, level=logging.WARNING):
+        super().__init__()
+        self.window = window
+        self.burst = burst
+        self.level = level
+        self._buckets = {}   # {key: [window_start, count, suppressed]}
+
+    def filter(self, record):
+        if record.levelno < self.level:
+            return True
+
+        key = (record.name, record.msg if isinstance(record.msg, str) else repr(record.msg))
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None or now - bucket[0] >= self.window:
+            suppressed = bucket[2] if bucket else 0
+            self._buckets[key] = [now, 1, 0]
+            if len(self._buckets) > 1024:
+                self._prune(now)
+        elif bucket[1] < self.burst:
+            bucket[1] += 1
+            suppressed, bucket[2] = bucket[2], 0
+        else:
+            bucket[2] += 1
+            return False
+
+        if suppressed:
+            record.suppressed = suppressed
+            record.msg = f"{record.msg} [{suppressed} similar messages suppressed]"
+        return True
+
+    def _prune(self, now):
+        for key in [k for k, b in self._buckets.items() if now - b[0] >= self.window and not b[2]]:
+            del self._buckets[key]
+
+
+def setup_logging(path="logs/system.log", json_output=False):
+    """ルートロガーをキュー経由の非同期出力に切り替え、開始済みの QueueListener を返す
+
+    イベントループ側はキューへの投入のみを行い、ファイルI/O・ローテーションは
+    リスナースレッドで実行する。終了時は listener.stop() で残りを書き出すこと。
+    """
+    if json_output:
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(
+            fmt='[{asctime}] [{levelname:<8}] {name}: {message}',
+            datefmt='%Y-%m-%d %H:%M:%S',
+            style='{'
+        )
+
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(formatter)
+    console_handler.setLevel(logging.INFO)
+
+    file_handler = logging.handlers.RotatingFileHandler(
+        filename=path,
+        encoding='utf-8',
+        maxBytes=5 * 1024 * 1024,
+        backupCount=5
+    )
+    file_handler.setFormatter(formatter)
+    file_handler.setLevel(logging.DEBUG)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(RateLimitFilter())
+
+    root = logging.getLogger()
+    root.setLevel(logging.INFO)
+    root.addHandler(queue_handler)
+
+    listener = logging.handlers.QueueListener(log_queue, console_handler, file_handler, respect_handler_level=True)
+    listener.start()
+    return listener
@@ -0,0 +1,100 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _culprit(frame):
+    """スタック中で最も内側にあるプロジェクト内のフレームから (モジュール, ハンドラ) を特定する"""
+    while frame is not None:
+        path = os.path.abspath(frame.f_code.co_filename)
+        if path.startswith(PROJECT_ROOT + os.sep) and path != os.path.abspath(__file__):
+            module = os.path.splitext(os.path.relpath(path, PROJECT_ROOT))[0].replace(os.sep, ".")
+            return module, getattr(frame.f_code, "co_qualname", frame.f_code.co_name)
+        frame = frame.f_back
+    return None, None
+
+
+class LoopWatchdog:
+    """イベントループの遅延（ラグ）を常時計測し、長時間ブロックしたコールバックのスタックを記録する
+
+    - ループ側：interval 秒ごとに起床し、予定時刻からの遅れをラグとして直近 window 件保持する
+    - 監視スレッド：ループ側の起床が threshold 秒以上途絶えたら、ループスレッドの
+      スタックを sys._current_frames() で取得し、原因のモジュールとハンドラ名を添えてログに出す
+    """
+
+    def __init__(self, interval=0.25, threshold=0.5, window=1200, histogram=None):
+        self.interval = interval
+        self.threshold = threshold
+        self.samples = deque(maxlen=window)
+        self.stalls = 0
+        self._histogram = histogram
+        self._last_tick = None
+        self._loop_thread = None
+        self._task = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self):
+        if self._task is not None:
+            return
+        self._loop_thread = threading.get_ident()
+        self._last_tick = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._probe())
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    async def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._thread is not None:
+            await asyncio.to_thread(self._thread.join, 1.0)
+            self._thread = None
+
+    async def _probe(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(now - expected, 0.0)
+            self._last_tick = now
+            self.samples.append(lag)
+            if self._histogram is not None:
+                self._histogram.observe(lag)
+            if lag >= self.threshold:
+                logger.warning("Event loop stall resolved after %.2fs", lag)
+
+    def _watch(self):
+        captured = None
+        while not self._stop.wait(self.threshold / 2):
+            tick = self._last_tick
+            stalled = time.monotonic() - tick - self.interval
+            if stalled < self.threshold or tick == captured:
+                continue
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is None:
+                continue
+            # 同じ停止は1回だけ記録する
+            captured = tick
+            self.stalls += 1
+            module, handler = _culprit(frame)
+            stack = "".join(traceback.format_stack(frame))
+            logger.warning("Event loop blocked for %.2fs+ in %s:%s\n%s", stalled, module or "unknown", handler or "-", stack)
+
+    def percentile(self, q):
+        """直近ウィンドウのラグの分位点（秒）。計測前は None"""
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
@@ -0,0 +1,53 @@
+import time
+from collections import OrderedDict
+
+
+class MemberLRU:
+    """最近アクティブだったメンバーのLRU（軽量キャッシュモード用）
+
+    ライブラリのメンバーキャッシュを無効化した構成で、/user のキャッシュミス時に
+    プレゼンス付きで取得したメンバーだけを capacity 件まで保持する（インタラクションや発言の
+    メンバーはプレゼンスを持たないため登録しない）。プレゼンスは更新イベントが届かないため、
+    取得から ttl 秒を過ぎたエントリは期限切れとして扱う。
+    """
+
+    def __init__(self, capacity=2048, ttl=300.0):
+        self.capacity = capacity
+        self.ttl = ttl
+        self._entries = OrderedDict()   # {(guild_id, member_id): (member, fetched_at)}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, guild_id, member_id):
+        """期限内のメンバーを返す（期限切れ・未登録は None）"""
+        key = (guild_id, member_id)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[1] > self.ttl:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, member):
+        key = (member.guild.id, member.id)
+        self._entries[key] = (member, time.monotonic())
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+
+    def discard(self, guild_id, member_id):
+        self._entries.pop((guild_id, member_id), None)
+
+    def drop_guild(self, guild_id):
+        for key in [k for k in self._entries if k[0] == guild_id]:
+            del self._entries[key]
+
+    def per_guild(self):
+        """ギルドごとの保持件数 {guild_id: count}"""
+        counts = {}
+        for guild_id, _ in self._entries:
+            counts[guild_id] = counts.get(guild_id, 0) + 1
+        return counts
@@ -0,0 +1,93 @@
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class _GuildBucket:
+    """ギルド単位のトークンバケット（メンバー編集ルートのレート制限に合わせる）"""
+    __slots__ = ("rate", "capacity", "tokens", "updated", "lock")
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class RoleMutationQueue:
+    """メンバー単位でロールの付与 / 解除要求をまとめるキュー
+
+    window 秒の間に届いた要求はロールIDごとの最終的な意図（付与 or 解除）に畳み込まれ、
+    1回の member.edit(roles=...) で反映される。往復クリックのように差分が無くなった
+    場合はAPIを呼ばない。実行はギルドごとのトークンバケットで流量を制限する。
+    """
+
+    def __init__(self, window=1.0, rate=1.0, burst=5):
+        self.window = window
+        self.rate = rate
+        self.burst = burst
+        self._pending = {}   # {(guild_id, member_id): (member, {role_id: bool})}
+        self._tasks = {}
+        self._buckets = {}
+
+    def has_role(self, member, role_id):
+        """保留中の要求を反映した「見かけ上の」保有状態"""
+        pending = self._pending.get((member.guild.id, member.id))
+        if pending is not None and role_id in pending[1]:
+            return pending[1][role_id]
+        return member.get_role(role_id) is not None
+
+    def submit(self, member, changes):
+        """{role_id: True(付与) / False(解除)} を登録する"""
+        key = (member.guild.id, member.id)
+        _, intents = self._pending.setdefault(key, (member, {}))
+        intents.update(changes)
+        if key not in self._tasks:
+            self._tasks[key] = asyncio.create_task(self._flush_later(key))
+
+    async def _flush_later(self, key):
+        try:
+            await asyncio.sleep(self.window)
+            member, intents = self._pending.pop(key)
+            await self._apply(member, intents)
+        except Exception as e:
+            logger.error("Role update for member %s failed: %s", key[1], e)
+        finally:
+            self._tasks.pop(key, None)
+            if key in self._pending:
+                self._tasks[key] = asyncio.create_task(self._flush_later(key))
+
+    async def _apply(self, member, intents):
+        guild = member.guild
+        member = guild.get_member(member.id) or member
+        current = {role.id for role in member.roles if not role.is_default()}
+
+        desired = set(current)
+        for role_id, wanted in intents.items():
+            if wanted:
+                desired.add(role_id)
+            else:
+                desired.discard(role_id)
+        if desired == current:
+            return
+
+        roles = [role for role in (guild.get_role(rid) for rid in desired) if role is not None]
+        bucket = self._buckets.get(guild.id)
+        if bucket is None:
+            bucket = self._buckets[guild.id] = _GuildBucket(self.rate, self.burst)
+        await bucket.acquire()
+        await member.edit(roles=roles, reason="Rb m/26S Role Panel")
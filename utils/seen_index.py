@@ -0,0 +1,39 @@
+class SeenIndex:
+    """最近通知した動画IDの有界集合
+
+    挿入順を保持する dict を順序付き集合として使い、判定・追加は O(1)、
+    capacity を超えた分は古い順（FIFO）に退避する。
+    永続化は空白区切りの文字列1本で行う。
+    """
+    __slots__ = ("capacity", "_ids")
+
+    def __init__(self, ids=(), capacity=50):
+        self.capacity = capacity
+        self._ids = {}
+        for video_id in ids:
+            self.add(video_id)
+
+    def __contains__(self, video_id):
+        return video_id in self._ids
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __iter__(self):
+        return iter(self._ids)
+
+    def add(self, video_id):
+        """未登録なら追加して True を返す"""
+        if video_id in self._ids:
+            return False
+        self._ids[video_id] = None
+        if len(self._ids) > self.capacity:
+            del self._ids[next(iter(self._ids))]
+        return True
+
+    def dump(self):
+        return " ".join(self._ids)
+
+    @classmethod
+    def load(cls, text, capacity=50):
+        return cls(text.split() if text else (), capacity=capacity)
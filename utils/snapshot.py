@@ -0,0 +1,183 @@
+import asyncio
+import base64
+import json
+import logging
+import os
+import struct
+import time
+import zlib
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"RBMS"
+FORMAT_VERSION = 1
+_HEADER = struct.Struct(">4sHd")      # マジック, 形式バージョン, 書き込み時刻
+_SECTION = struct.Struct(">HHdI")     # 名前長, キャッシュ版数, 保存時刻, 本体長
+
+
+def encode_snapshot(sections, written_at):
+    """{name: (version, saved_at, data)} をバイナリへ変換する（各本体は zlib 圧縮した JSON）"""
+    parts = [_HEADER.pack(MAGIC, FORMAT_VERSION, written_at)]
+    for name, (version, saved_at, data) in sections.items():
+        name_bytes = name.encode()
+        body = zlib.compress(json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode(), 6)
+        parts.append(_SECTION.pack(len(name_bytes), version, saved_at, len(body)))
+        parts.append(name_bytes)
+        parts.append(body)
+    return b"".join(parts)
+
+
+def decode_snapshot(raw):
+    """バイナリから {name: (version, saved_at, data)} を復元する（形式が異なれば ValueError）"""
+    magic, format_version, _ = _HEADER.unpack_from(raw, 0)
+    if magic != MAGIC or format_version != FORMAT_VERSION:
+        raise ValueError(f"unsupported snapshot format {magic!r} v{format_version}")
+
+    sections = {}
+    offset = _HEADER.size
+    while offset < len(raw):
+        name_len, version, saved_at, body_len = _SECTION.unpack_from(raw, offset)
+        offset += _SECTION.size
+        name = raw[offset:offset + name_len].decode()
+        offset += name_len
+        body = raw[offset:offset + body_len]
+        offset += body_len
+        if len(body) != body_len:
+            raise ValueError(f"truncated snapshot section {name}")
+        sections[name] = (version, saved_at, json.loads(zlib.decompress(body)))
+    return sections
+
+
+class _Registration:
+    __slots__ = ("dump", "restore", "max_age", "version")
+
+    def __init__(self, dump, restore, max_age, version):
+        self.dump = dump
+        self.restore = restore
+        self.max_age = max_age
+        self.version = version
+
+
+class SnapshotStore:
+    """再起動を跨いでメモリ上のキャッシュを引き継ぐスナップショット
+
+    各Cogは register() で dump / restore 関数とキャッシュごとの有効期限を登録する。
+    起動時に読み込んだファイルに該当するセクションがあり、版数が一致し期限内であれば
+    登録と同時に restore(data) が呼ばれる（ゲートウェイ接続前）。
+    保存は interval 秒ごとと終了時に行い、圧縮・書き込みはワーカースレッドで実行する。
+    remote（StateStore）を渡すと非公開のGistにも base64 で複製し、ローカルファイルが
+    ない環境（GitHub Actions の新しいランナー）ではGistから読み込む。
+    """
+
+    def __init__(self, path="cache/snapshot.bin", interval=600.0, remote=None, remote_name="rb_m26s_snapshot.b64"):
+        self.path = path
+        self.interval = interval
+        self.remote = remote
+        self.remote_name = remote_name
+        self._registry = {}
+        self._loaded = {}
+        self._timer = None
+        self._lock = asyncio.Lock()
+
+    async def load(self):
+        """スナップショットを読み込む（ローカルになければGistから。壊れている場合は空として扱う）"""
+        self._loaded = {}
+        source = self.path
+        try:
+            with open(self.path, "rb") as f:
+                raw = f.read()
+        except FileNotFoundError:
+            raw = None
+            if self.remote is not None:
+                source = f"gist:{self.remote_name}"
+                content = await self.remote.read_file(self.remote_name)
+                raw = base64.b64decode(content) if content else None
+        except OSError as e:
+            logger.warning("Ignoring unreadable snapshot %s: %s", self.path, e)
+            raw = None
+
+        if raw:
+            try:
+                self._loaded = decode_snapshot(raw)
+            except (ValueError, struct.error, zlib.error) as e:
+                logger.warning("Ignoring unreadable snapshot %s: %s", source, e)
+        return len(self._loaded)
+
+    def register(self, name, dump, restore, max_age, version=1):
+        """キャッシュを登録し、有効なセクションがあれば即座に復元する。復元したら True"""
+        self._registry[name] = _Registration(dump, restore, max_age, version)
+
+        section = self._loaded.pop(name, None)
+        if section is None:
+            return False
+        saved_version, saved_at, data = section
+        age = time.time() - saved_at
+        if saved_version != version:
+            logger.info("Snapshot %s: version %s != %s, discarded.", name, saved_version, version)
+            return False
+        if age > max_age:
+            logger.info("Snapshot %s: %.0fs old (limit %.0fs), discarded.", name, age, max_age)
+            return False
+        try:
+            restore(data)
+        except Exception as e:
+            logger.error("Snapshot %s: restore failed: %s", name, e, exc_info=True)
+            return False
+        logger.info("Snapshot %s: restored (%.0fs old).", name, age)
+        return True
+
+    def unregister(self, name):
+        self._registry.pop(name, None)
+
+    async def save(self):
+        """登録済みキャッシュを収集して書き出す"""
+        async with self._lock:
+            now = time.time()
+            sections = {}
+            for name, reg in self._registry.items():
+                try:
+                    data = reg.dump()
+                except Exception as e:
+                    logger.error("Snapshot %s: dump failed: %s", name, e)
+                    continue
+                if data is not None:
+                    sections[name] = (reg.version, now, data)
+            # 今回登録されなかったキャッシュ（Cogの読み込み失敗など）は元の保存時刻のまま引き継ぐ
+            for name, section in self._loaded.items():
+                sections.setdefault(name, section)
+            try:
+                raw = await asyncio.to_thread(self._write, sections, now)
+            except OSError as e:
+                logger.error("Snapshot write to %s failed: %s", self.path, e)
+                return False
+            if self.remote is not None:
+                await self.remote.write_file(self.remote_name, base64.b64encode(raw).decode())
+            logger.info("Snapshot saved: %s caches, %s bytes.", len(sections), len(raw))
+            return True
+
+    def _write(self, sections, now):
+        raw = encode_snapshot(sections, now)
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(raw)
+        os.replace(tmp, self.path)
+        return raw
+
+    def start(self):
+        if self._timer is None:
+            self._timer = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.save()
+
+    async def close(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._registry:
+            await self.save()
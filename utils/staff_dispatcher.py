@@ -0,0 +1,104 @@
+import heapq
+import itertools
+
+_REMOVED = None
+
+
+class StaffDispatcher:
+    """未解決チケット数と直近の応答時間をキーにした担当者選択用の最小ヒープ
+
+    対応可能なスタッフだけをヒープに載せ、(担当件数, 応答時間EWMA, 投入順) が最小の
+    スタッフへ O(log n) で割り当てる。優先度が変わったエントリは無効化して積み直す
+    （heapq の遅延削除）。担当件数はオフラインのスタッフについても保持する。
+    """
+
+    def __init__(self, alpha=0.3, default_response=600.0):
+        self.alpha = alpha
+        self.default_response = default_response
+        self._heap = []
+        self._entries = {}    # {staff_id: ヒープ上の有効なエントリ}
+        self._load = {}       # {staff_id: 担当中の件数}
+        self._response = {}   # {staff_id: 初回応答までの秒数のEWMA}
+        self._tickets = {}    # {ticket_id: staff_id}
+        self._seq = itertools.count()
+
+    def __contains__(self, staff_id):
+        return staff_id in self._entries
+
+    def _push(self, staff_id):
+        self._discard_entry(staff_id)
+        entry = [self._load.get(staff_id, 0), self._response.get(staff_id, self.default_response), next(self._seq), staff_id]
+        self._entries[staff_id] = entry
+        heapq.heappush(self._heap, entry)
+        # 無効化済みエントリが溜まったら有効なものだけで作り直す
+        if len(self._heap) > 4 * len(self._entries) + 64:
+            self._heap = [e for e in self._heap if e[-1] is not _REMOVED]
+            heapq.heapify(self._heap)
+
+    def _discard_entry(self, staff_id):
+        entry = self._entries.pop(staff_id, None)
+        if entry is not None:
+            entry[-1] = _REMOVED
+
+    def _refresh(self, staff_id):
+        if staff_id in self._entries:
+            self._push(staff_id)
+
+    # --- 対応可否 ---
+    def set_available(self, staff_id, available=True):
+        if available:
+            if staff_id not in self._entries:
+                self._push(staff_id)
+        else:
+            self._discard_entry(staff_id)
+
+    # --- 割り当て ---
+    def assign(self, ticket_id):
+        """最も空いているスタッフを割り当てて返す（対応可能なスタッフがいなければ None）"""
+        while self._heap:
+            entry = self._heap[0]
+            if entry[-1] is _REMOVED:
+                heapq.heappop(self._heap)
+                continue
+            staff_id = entry[-1]
+            self.attach(ticket_id, staff_id)
+            return staff_id
+        return None
+
+    def attach(self, ticket_id, staff_id):
+        """既存の担当関係を登録する（起動時の再構築・割り当て共通）"""
+        self.release(ticket_id)
+        self._tickets[ticket_id] = staff_id
+        self._load[staff_id] = self._load.get(staff_id, 0) + 1
+        self._refresh(staff_id)
+
+    def release(self, ticket_id):
+        """チケットの閉鎖・再割り当て時に担当件数を戻し、元の担当者を返す"""
+        staff_id = self._tickets.pop(ticket_id, None)
+        if staff_id is not None:
+            self._load[staff_id] = max(self._load.get(staff_id, 1) - 1, 0)
+            self._refresh(staff_id)
+        return staff_id
+
+    def assignee(self, ticket_id):
+        return self._tickets.get(ticket_id)
+
+    def tickets_of(self, staff_id):
+        return [ticket_id for ticket_id, sid in self._tickets.items() if sid == staff_id]
+
+    def record_response(self, staff_id, seconds):
+        """初回応答までの時間を指数移動平均で反映する"""
+        previous = self._response.get(staff_id)
+        self._response[staff_id] = seconds if previous is None else previous + self.alpha * (seconds - previous)
+        self._refresh(staff_id)
+
+    def response_times(self):
+        return dict(self._response)
+
+    def seed_response(self, staff_id, seconds):
+        """前回セッションの応答時間EWMAを引き継ぐ"""
+        self._response[staff_id] = seconds
+        self._refresh(staff_id)
+
+    def load(self, staff_id):
+        return self._load.get(staff_id, 0)
@@ -0,0 +1,201 @@
+import asyncio
+import json
+import logging
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+
+class StateStore:
+    """Gist外部メモリ (rb_m26s_data.json) をボット全体で共有する状態ストア
+
+    起動時に一度だけロードし、読み取りは常にメモリから返す。
+    各Cogからの書き込みはメモリへ即時反映し、flush_delay 秒まとめてから
+    1回のPATCHでGistへ書き戻す（write-behind）。
+    ロードに一度も成功していない間は既定値でGistを上書きしないよう書き戻しを保留し、
+    次回のflush時にロードを再試行して、保留中の変更をGistの内容へ重ねる。
+    """
+
+    def __init__(self, web, gist_id, gist_token, filename="rb_m26s_data.json", flush_delay=10.0):
+        self.web = web
+        self.gist_id = gist_id
+        self.gist_token = gist_token
+        self.filename = filename
+        self.flush_delay = flush_delay
+        self.url = f"https://api.github.com/gists/{gist_id}"
+
+        # メモリ上のデータ構造（欠落防止用初期値）
+        self.data = {
+            "channel_id": None,
+            "role_id": None,
+            "last_video_id": "",
+            "ticket_count": 0,
+            "last_updated": ""
+        }
+        self.loaded = False
+        self._pending = set()   # ロード成功前に書き込まれたキー
+        self._dirty = False
+        self._flush_task = None
+        self._lock = asyncio.Lock()
+        self._load_lock = asyncio.Lock()
+
+    @property
+    def enabled(self):
+        return bool(self.gist_id and self.gist_token)
+
+    def _headers(self):
+        return {
+            "Authorization": f"token {self.gist_token}",
+            "Accept": "application/vnd.github.v3+json"
+        }
+
+    # --- 読み取り（メモリのみ） ---
+    def get(self, key, default=None):
+        value = self.data.get(key)
+        return default if value is None else value
+
+    # --- 書き込み（メモリへ反映し、遅延PATCHを予約） ---
+    def update(self, new_data):
+        self.data.update(new_data)
+        if not self.loaded:
+            self._pending.update(new_data)
+        self.data["last_updated"] = datetime.now().isoformat()
+        self._dirty = True
+        if self._flush_task is None and self.enabled:
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self, delay=None):
+        delay = self.flush_delay if delay is None else delay
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            return
+        self._flush_task = None
+        if not await self.flush() and self._dirty and self._flush_task is None:
+            # 失敗時は間隔を延ばしながら再送する
+            self._flush_task = asyncio.create_task(self._flush_later(min(delay * 2, 300.0)))
+
+    async def _fetch(self):
+        """Gistの内容を取得する（失敗時は None）"""
+        try:
+            response = await self.web.get(self.url, headers=self._headers())
+            if response.status != 200:
+                logger.critical("Rb m/26S Load Failed: %s", response.status)
+                return None
+            files = response.json().get("files", {})
+            if self.filename not in files:
+                return {}
+            return json.loads(files[self.filename].get("content", "{}"))
+        except Exception as e:
+            logger.critical("Rb m/26S Load Exception: %s", e)
+            return None
+
+    async def load(self):
+        """起動時に一度だけGistからデータを復元する"""
+        if not self.enabled:
+            logger.critical("Rb m/26S Error: Gist credentials missing in Environment Variables.")
+            return self.data
+
+        await self.ensure_loaded()
+        return self.data
+
+    async def ensure_loaded(self):
+        """未ロードならGistから取得し、ロード前の変更をその上に重ねる。ロード済みなら True"""
+        if self.loaded or not self.enabled:
+            return self.loaded
+
+        async with self._load_lock:
+            if self.loaded:
+                return True
+            remote = await self._fetch()
+            if remote is None:
+                logger.critical("Rb m/26S: Gist state is not loaded; writes are held until a load succeeds.")
+                return False
+
+            pending = {key: self.data[key] for key in self._pending}
+            self.data.update(remote)
+            for key, value in pending.items():
+                # 辞書型のキー（購読・ギルド別設定など）はGist側の項目を残して重ねる
+                if isinstance(value, dict) and isinstance(self.data.get(key), dict):
+                    value = {**self.data[key], **value}
+                self.data[key] = value
+            self._pending.clear()
+            self.loaded = True
+            logger.info("Rb m/26S: Data recovered from Gist.")
+            return True
+
+    async def flush(self):
+        """未反映の変更を1回のPATCHでGistへ書き戻す"""
+        if not self.enabled:
+            return False
+
+        async with self._lock:
+            if not self._dirty:
+                return True
+            # 既定値のままGist全体を上書きしないよう、ロード成功までPATCHしない
+            if not await self.ensure_loaded():
+                return False
+
+            self._dirty = False
+            payload = {
+                "files": {
+                    self.filename: {
+                        "content": json.dumps(self.data, indent=4, ensure_ascii=False)
+                    }
+                }
+            }
+
+            try:
+                res = await self.web.patch(self.url, headers=self._headers(), json=payload)
+                if res.status == 200:
+                    logger.info("Rb m/26S: Persistent memory updated.")
+                    return True
+                logger.error("Rb m/26S Sync Failed: %s", res.status)
+            except Exception as e:
+                logger.error("Rb m/26S Protocol Exception: %s", e)
+
+            # 失敗時は次回のflushで再送する
+            self._dirty = True
+            return False
+
+    # --- 同じGist上の別ファイル（スナップショットなど） ---
+    async def read_file(self, name):
+        """Gist上の別ファイルの内容を返す（存在しない・失敗時は None）"""
+        if not self.enabled:
+            return None
+        try:
+            response = await self.web.get(self.url, headers=self._headers())
+            if response.status != 200:
+                logger.error("Rb m/26S: reading %s failed: %s", name, response.status)
+                return None
+            file = response.json().get("files", {}).get(name)
+            if file is None:
+                return None
+            # 1MBを超えるファイルは本文が省略されるため raw_url から取得する
+            if file.get("truncated"):
+                raw = await self.web.get(file["raw_url"], headers=self._headers())
+                return raw.body.decode() if raw.status == 200 else None
+            return file.get("content")
+        except Exception as e:
+            logger.error("Rb m/26S: reading %s failed: %s", name, e)
+            return None
+
+    async def write_file(self, name, content):
+        """Gist上の別ファイルを書き込む（状態ファイルには触れない）"""
+        if not self.enabled:
+            return False
+        try:
+            res = await self.web.patch(self.url, headers=self._headers(), json={"files": {name: {"content": content}}})
+            if res.status == 200:
+                return True
+            logger.error("Rb m/26S: writing %s failed: %s", name, res.status)
+        except Exception as e:
+            logger.error("Rb m/26S: writing %s failed: %s", name, e)
+        return False
+
+    async def close(self):
+        """シャットダウン時に予約中のPATCHを待たずに即時反映する"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
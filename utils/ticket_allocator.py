@@ -0,0 +1,81 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class LeaseUnavailable(Exception):
+    """番号ブロックをGistへ保存できず、チケット番号を払い出せない"""
+
+
+class TicketNumberAllocator:
+    """チケット番号をブロック単位でリースし、メモリから払い出すアロケータ
+
+    状態ストアの ``key`` には「リース済みの最終番号」を保存する。
+    ブロックを確保してGistへ書き込み、保存に成功してから払い出すため、
+    再起動を跨いでも番号が重複することはない（未使用分は欠番になる）。
+    保存に失敗している間はバックオフしながら再試行する。
+    払い出しは asyncio.Lock で直列化され、残りが low_watermark を下回ると
+    次のブロックをバックグラウンドで先行確保する。
+    """
+
+    def __init__(self, state, key="ticket_count", block_size=50, low_watermark=10):
+        self.state = state
+        self.key = key
+        self.block_size = block_size
+        self.low_watermark = low_watermark
+
+        self._next = None       # 次に払い出す番号
+        self._lease_end = 0     # リース済みの最終番号（この番号まで払い出し可能）
+        self._lock = asyncio.Lock()
+        self._renew_task = None
+
+    def prime(self):
+        """起動直後に最初のブロックを先行確保する"""
+        return self._start_renewal()
+
+    def _start_renewal(self):
+        if self._renew_task is None or self._renew_task.done():
+            self._renew_task = asyncio.create_task(self._renew())
+        return self._renew_task
+
+    async def _renew(self):
+        """次のブロックをGistへ書き込み、保存に成功してから払い出し可能にする"""
+        end = None
+        delay = 1.0
+        while True:
+            if not self.state.enabled:
+                # 永続化先がない（開発環境など）場合はメモリ上のみでリースする
+                end = max(self.state.get(self.key, 0), self._lease_end) + self.block_size
+                break
+            # ロード前の既定値から番号を数え直さないよう、Gistのロード成功を待つ
+            if await self.state.ensure_loaded():
+                if end is None:
+                    end = max(self.state.get(self.key, 0), self._lease_end) + self.block_size
+                    self.state.update({self.key: end})
+                if await self.state.flush():
+                    break
+            logger.warning("Ticket lease is not durable yet; retrying in %.0fs.", delay)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 60.0)
+
+        if self._next is None:
+            self._next = end - self.block_size + 1
+        self._lease_end = end
+        logger.info("Ticket numbers leased up to #%s.", end)
+
+    async def allocate(self, timeout=10.0):
+        """一意なチケット番号を1つ払い出す（timeout 秒以内にリースを保存できなければ LeaseUnavailable）"""
+        async with self._lock:
+            while self._next is None or self._next > self._lease_end:
+                try:
+                    await asyncio.wait_for(asyncio.shield(self._start_renewal()), timeout)
+                except asyncio.TimeoutError:
+                    raise LeaseUnavailable("ticket numbers could not be leased") from None
+
+            number = self._next
+            self._next += 1
+
+            if self._lease_end - number < self.low_watermark:
+                self._start_renewal()
+            return number
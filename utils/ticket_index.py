@@ -0,0 +1,73 @@
+import re
+
+# チケットチャンネルのトピック "User ID: <id> | 発行日時: ..." から作成者を読み取る
+TOPIC_PATTERN = re.compile(r"^User ID: (\d+)")
+
+
+class OpenTicketIndex:
+    """ギルド・ユーザー単位の未解決チケット索引
+
+    起動時にチャンネルトピックから1回で再構築し、以降は作成・閉鎖・チャンネル削除で更新する。
+    作成中のチケットは予約として数えるため、連打しても上限を超えて作成されない。
+    """
+
+    def __init__(self):
+        self._by_user = {}    # {(guild_id, user_id): {channel_id, ...}}
+        self._by_channel = {} # {channel_id: (guild_id, user_id)}
+        self._reserved = {}   # {(guild_id, user_id): 作成中の件数}
+
+    def __len__(self):
+        return len(self._by_channel)
+
+    def rebuild(self, guilds):
+        """全ギルドのテキストチャンネルを走査して索引を作り直す"""
+        self._by_user.clear()
+        self._by_channel.clear()
+        for guild in guilds:
+            for channel in guild.text_channels:
+                match = TOPIC_PATTERN.match(channel.topic or "")
+                if match:
+                    self.add(guild.id, int(match.group(1)), channel.id)
+        return len(self._by_channel)
+
+    def add(self, guild_id, user_id, channel_id):
+        self._by_user.setdefault((guild_id, user_id), set()).add(channel_id)
+        self._by_channel[channel_id] = (guild_id, user_id)
+
+    def remove_channel(self, channel_id):
+        key = self._by_channel.pop(channel_id, None)
+        if key is None:
+            return
+        channels = self._by_user.get(key)
+        if channels is not None:
+            channels.discard(channel_id)
+            if not channels:
+                del self._by_user[key]
+
+    def open_tickets(self, guild_id):
+        """ギルド内の未解決チケット [(channel_id, user_id), ...]"""
+        return [(cid, uid) for cid, (gid, uid) in self._by_channel.items() if gid == guild_id]
+
+    def channels(self, guild_id, user_id):
+        return self._by_user.get((guild_id, user_id), set())
+
+    def count(self, guild_id, user_id):
+        key = (guild_id, user_id)
+        return len(self._by_user.get(key, ())) + self._reserved.get(key, 0)
+
+    def reserve(self, guild_id, user_id, limit):
+        """上限未満なら作成枠を1つ予約して True を返す（limit <= 0 は無制限）"""
+        if limit > 0 and self.count(guild_id, user_id) >= limit:
+            return False
+        key = (guild_id, user_id)
+        self._reserved[key] = self._reserved.get(key, 0) + 1
+        return True
+
+    def release(self, guild_id, user_id):
+        """予約を解除する（作成成功時は add の後、失敗時はそのまま呼ぶ）"""
+        key = (guild_id, user_id)
+        remaining = self._reserved.get(key, 0) - 1
+        if remaining > 0:
+            self._reserved[key] = remaining
+        else:
+            self._reserved.pop(key, None)
@@ -0,0 +1,101 @@
+import asyncio
+import gzip
+import json
+import logging
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+
+def message_record(message):
+    """トランスクリプト1行分の辞書（本文・添付URL・埋め込み・返信先）"""
+    return {
+        "id": message.id,
+        "created_at": message.created_at.isoformat(),
+        "edited_at": message.edited_at.isoformat() if message.edited_at else None,
+        "author": {"id": message.author.id, "name": str(message.author), "bot": message.author.bot},
+        "type": message.type.name,
+        "content": message.content,
+        "attachments": [
+            {"filename": a.filename, "url": a.url, "size": a.size, "content_type": a.content_type}
+            for a in message.attachments
+        ],
+        "embeds": [embed.to_dict() for embed in message.embeds],
+        "reference": message.reference.message_id if message.reference else None,
+    }
+
+
+class TranscriptWriter:
+    """gzip圧縮したJSONLを一時ファイルへ逐次書き出すライタ
+
+    シリアライズした行は flush_bytes まで溜めてから、圧縮と書き込みをワーカースレッドで行う。
+    保持するのは未圧縮の1バッファ分のみで、チケットの長さに関わらずメモリ使用量は一定になる。
+    part_bytes を指定すると、圧縮後のサイズがそれを超えないよう複数のファイル（それぞれ単独で
+    展開できる gzip）に分割する。
+    """
+
+    def __init__(self, flush_bytes=256 * 1024, compresslevel=6, part_bytes=None):
+        self.flush_bytes = flush_bytes
+        self.compresslevel = compresslevel
+        self.part_bytes = part_bytes
+        self.count = 0
+        self._parts = []     # 書き終えた分割ファイル [(file, size), ...]
+        self._buffer = []
+        self._buffered = 0
+        self._open_part()
+
+    def _open_part(self):
+        self._file = tempfile.TemporaryFile()
+        self._gzip = gzip.GzipFile(fileobj=self._file, mode="wb", compresslevel=self.compresslevel)
+
+    def _close_part(self):
+        self._gzip.close()
+        self._parts.append((self._file, self._file.tell()))
+
+    def _write_chunk(self, chunk):
+        self._gzip.write(chunk)
+        if self.part_bytes is None:
+            return
+        # 圧縮器内の未出力分を吐き出して実サイズを確定させ、次のバッファが収まらなければ分割する
+        self._gzip.flush()
+        if self._file.tell() + 2 * self.flush_bytes > self.part_bytes:
+            self._close_part()
+            self._open_part()
+
+    async def write(self, record):
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode() + b"\n"
+        self._buffer.append(line)
+        self._buffered += len(line)
+        self.count += 1
+        if self._buffered >= self.flush_bytes:
+            await self._flush()
+
+    async def _flush(self):
+        if not self._buffer:
+            return
+        chunk = b"".join(self._buffer)
+        self._buffer, self._buffered = [], 0
+        await asyncio.to_thread(self._write_chunk, chunk)
+
+    async def finish(self):
+        """残りを書き出して圧縮を終え、先頭に巻き戻した分割ファイルと圧縮後サイズの一覧を返す"""
+        await self._flush()
+        await asyncio.to_thread(self._close_part)
+        self._file = None
+        for fileobj, _ in self._parts:
+            fileobj.seek(0)
+        return list(self._parts)
+
+    def close(self):
+        if self._file is not None:
+            self._gzip.close()
+            self._file.close()
+        for fileobj, _ in self._parts:
+            fileobj.close()
+
+
+async def export_channel(channel, writer):
+    """チャンネル履歴を古い順にページ単位で取得し、ライタへ流し込む"""
+    async for message in channel.history(limit=None, oldest_first=True):
+        await writer.write(message_record(message))
+    return writer.count
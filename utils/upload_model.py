@@ -0,0 +1,126 @@
+import math
+from datetime import datetime, timezone
+
+HOURS_PER_WEEK = 168
+WEEK_SECONDS = HOURS_PER_WEEK * 3600
+
+
+def _parse_published(text):
+    try:
+        published = datetime.fromisoformat(text)
+    except (TypeError, ValueError):
+        return None
+    if published.tzinfo is None:
+        published = published.replace(tzinfo=timezone.utc)
+    return published.astimezone(timezone.utc)
+
+
+def _hour_of_week(dt):
+    return dt.weekday() * 24 + dt.hour
+
+
+class UploadModel:
+    """フィードの投稿時刻分布（曜日×時間帯）から次のポーリング間隔を決めるモデル
+
+    - 投稿が多い時間帯は target / 投稿率 まで間隔を詰め、その時間帯の開始に合わせて起床する
+    - 新着の無いポーリングが続く間は base_interval から指数的に間隔を広げる
+    - 間隔は常に [min_interval, max_interval] に収める
+    """
+    __slots__ = ("min_interval", "max_interval", "base_interval", "target", "_rate", "_last_upload", "_quiet_polls")
+
+    def __init__(self, min_interval=60.0, max_interval=3600.0, base_interval=300.0, target=0.05):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.base_interval = base_interval
+        self.target = target              # 1回の間隔内に見込む投稿数の上限
+        self._rate = [0.0] * HOURS_PER_WEEK  # 時間帯ごとの投稿率（件/時）
+        self._last_upload = None
+        self._quiet_polls = 0
+
+    @property
+    def trained(self):
+        return self._last_upload is not None
+
+    def observe(self, entries):
+        """フィードのエントリから分布を再学習する。新着があれば True を返す"""
+        times = sorted(t for t in (_parse_published(e.published) for e in entries) if t is not None)
+        if not times:
+            self.record_quiet()
+            return False
+
+        latest = times[-1]
+        is_new = self._last_upload is not None and latest > self._last_upload
+        if self._last_upload is None or is_new:
+            self._quiet_polls = 0
+        else:
+            self._quiet_polls += 1
+        self._last_upload = latest if self._last_upload is None else max(latest, self._last_upload)
+
+        # 前後1時間へ平滑化しつつ、観測期間（週数）で割って投稿率にする
+        weeks = max((times[-1] - times[0]).total_seconds() / WEEK_SECONDS, 1.0)
+        rate = [0.0] * HOURS_PER_WEEK
+        for t in times:
+            h = _hour_of_week(t)
+            rate[h] += 0.5 / weeks
+            rate[(h - 1) % HOURS_PER_WEEK] += 0.25 / weeks
+            rate[(h + 1) % HOURS_PER_WEEK] += 0.25 / weeks
+        self._rate = rate
+        return is_new
+
+    def dump(self):
+        """スナップショット用の辞書（学習済みの場合のみ）"""
+        if not self.trained:
+            return None
+        return {"rate": self._rate, "last_upload": self._last_upload.isoformat(), "quiet": self._quiet_polls}
+
+    def restore(self, data):
+        rate = data.get("rate")
+        if not isinstance(rate, list) or len(rate) != HOURS_PER_WEEK:
+            return
+        self._rate = [float(r) for r in rate]
+        self._last_upload = _parse_published(data.get("last_upload"))
+        self._quiet_polls = int(data.get("quiet", 0))
+
+    def record_quiet(self):
+        """304などで新着が無かったポーリングを記録する"""
+        self._quiet_polls += 1
+
+    def _clamp(self, seconds):
+        return min(max(seconds, self.min_interval), self.max_interval)
+
+    def _rate_interval(self, rate):
+        return self.target / rate * 3600 if rate > 0 else math.inf
+
+    def _seconds_until_hot(self, now):
+        """次に「間隔を詰めるべき時間帯」が始まるまでの秒数"""
+        start = _hour_of_week(now)
+        into_hour = now.minute * 60 + now.second
+        for offset in range(1, HOURS_PER_WEEK):
+            if self._rate_interval(self._rate[(start + offset) % HOURS_PER_WEEK]) < self.max_interval:
+                return offset * 3600 - into_hour
+        return None
+
+    def next_interval(self, now=None):
+        """次のポーリングまでの秒数"""
+        if not self.trained:
+            return self._clamp(self.base_interval)
+
+        now = now or datetime.now(timezone.utc)
+        h = _hour_of_week(now)
+        rate = max(self._rate[h], self._rate[(h + 1) % HOURS_PER_WEEK])
+
+        backoff = self.base_interval * (2 ** min(self._quiet_polls, 16))
+        interval = min(self._rate_interval(rate), backoff)
+
+        until_hot = self._seconds_until_hot(now)
+        if until_hot is not None:
+            interval = min(interval, until_hot)
+        return self._clamp(interval)
+
+    def expected_latency(self):
+        """投稿分布で重み付けした検知遅延の期待値（秒）。間隔の半分を平均遅延とみなす"""
+        total = sum(self._rate)
+        if total <= 0:
+            return None
+        weighted = sum(r * self._clamp(self._rate_interval(r)) / 2 for r in self._rate if r > 0)
+        return weighted / total
@@ -0,0 +1,324 @@
+import asyncio
+import hmac
+import logging
+import secrets
+import time
+from urllib.parse import urlsplit
+
+from utils.yt_feed import parse_feed
+
+logger = logging.getLogger(__name__)
+
+HUB_URL = "https://pubsubhubbub.appspot.com/subscribe"
+TOPIC_URL = "https://www.youtube.com/xml/feeds/videos.xml?channel_id={channel_id}"
+# X-Hub-Signature で受け付けるハッシュ（WebSub仕様の sha1 / sha2 系のみ）
+SIGNATURE_ALGORITHMS = {"sha1", "sha256", "sha384", "sha512"}
+
+
+class WebSubSubscriber:
+    """WebSub (PubSubHubbub) によるYouTube新着のプッシュ受信
+
+    組み込みのaiohttpサーバーでハブの購読確認 (hub.challenge) に応答し、
+    HMAC署名を検証したうえでプッシュされたAtomを解析して on_notify(feed_id, feed) を呼ぶ。
+    購読はリース期限の renew_margin 秒前に自動更新される。
+    ハブに拒否・否認された購読は retry_base 秒から倍々に（最大 retry_max 秒）間隔を空けて再送する。
+
+    ローカルの疑似ハブを相手にした動作確認は ``python -m utils.websub`` で実行できる。
+    """
+
+    def __init__(self, web, callback_url, on_notify, secret=None, host="0.0.0.0", port=8080,
+                 hub_url=HUB_URL, lease_seconds=432000, renew_margin=3600, retry_base=600, retry_max=86400):
+        self.web = web
+        self.callback_url = callback_url
+        self.on_notify = on_notify
+        self.secret = (secret or secrets.token_hex(16)).encode()
+        self.host = host
+        self.port = port
+        self.hub_url = hub_url
+        self.lease_seconds = lease_seconds
+        self.renew_margin = renew_margin
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+
+        self._wanted = set()
+        self._pending = {}   # feed_id -> (mode, requested_at)
+        self._leases = {}    # feed_id -> 期限 (time.time())
+        self._failures = {}  # feed_id -> 連続失敗回数
+        self._retry_at = {}  # feed_id -> 次に再送してよい時刻 (time.time())
+        self._runner = None
+        self._renew_task = None
+        self._tasks = set()
+        self.stats = {"notifications": 0, "rejected": 0, "verified": 0}
+
+    def __contains__(self, feed_id):
+        return feed_id in self._wanted
+
+    @staticmethod
+    def topic_url(feed_id):
+        return TOPIC_URL.format(channel_id=feed_id)
+
+    def _callback_for(self, feed_id):
+        sep = "&" if "?" in self.callback_url else "?"
+        return f"{self.callback_url}{sep}feed_id={feed_id}"
+
+    # --- ライフサイクル ---
+    async def start(self):
+        from aiohttp import web
+
+        app = web.Application()
+        path = urlsplit(self.callback_url).path or "/"
+        app.router.add_get(path, self._handle_verify)
+        app.router.add_post(path, self._handle_notify)
+
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        self._renew_task = asyncio.create_task(self._renew_loop())
+        logger.info(f"WebSub endpoint listening on {self.host}:{self.port}{path}")
+
+    async def stop(self, timeout=10.0):
+        if self._renew_task is not None:
+            self._renew_task.cancel()
+            self._renew_task = None
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+        # 受信済みプッシュの通知・既読更新を終えてから停止する（timeout 秒を過ぎた分は取り消す）
+        if self._tasks:
+            _, pending = await asyncio.wait(set(self._tasks), timeout=timeout)
+            for task in pending:
+                task.cancel()
+
+    def lease_remaining(self, feed_id):
+        expires = self._leases.get(feed_id)
+        return None if expires is None else max(0.0, expires - time.time())
+
+    # --- ハブへの購読要求 ---
+    async def _request(self, feed_id, mode):
+        self._pending[feed_id] = (mode, time.time())
+        data = {
+            "hub.callback": self._callback_for(feed_id),
+            "hub.topic": self.topic_url(feed_id),
+            "hub.verify": "async",
+            "hub.mode": mode,
+            "hub.secret": self.secret.decode(),
+            "hub.lease_seconds": str(self.lease_seconds)
+        }
+        try:
+            res = await self.web.post(self.hub_url, data=data)
+            if res.status not in (202, 204):
+                logger.warning("WebSub %s for %s rejected by hub: %s", mode, feed_id, res.status)
+                self._back_off(feed_id)
+        except Exception as e:
+            logger.warning("WebSub %s for %s failed: %s", mode, feed_id, e)
+            self._back_off(feed_id)
+
+    def _back_off(self, feed_id):
+        """購読の失敗回数に応じて次の再送時刻を遅らせる"""
+        failures = self._failures.get(feed_id, 0) + 1
+        self._failures[feed_id] = failures
+        delay = min(self.retry_base * 2 ** (failures - 1), self.retry_max)
+        self._retry_at[feed_id] = time.time() + delay
+        logger.info("WebSub subscription for %s will be retried in %ss.", feed_id, int(delay))
+
+    async def subscribe(self, feed_id):
+        self._wanted.add(feed_id)
+        await self._request(feed_id, "subscribe")
+
+    async def unsubscribe(self, feed_id):
+        self._wanted.discard(feed_id)
+        self._leases.pop(feed_id, None)
+        self._failures.pop(feed_id, None)
+        self._retry_at.pop(feed_id, None)
+        await self._request(feed_id, "unsubscribe")
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def watch(self, feed_id):
+        """購読要求をバックグラウンドで送信する"""
+        if feed_id not in self._wanted:
+            self._wanted.add(feed_id)
+            self._spawn(self.subscribe(feed_id))
+
+    def unwatch(self, feed_id):
+        if feed_id in self._wanted:
+            self._spawn(self.unsubscribe(feed_id))
+
+    async def _renew_loop(self):
+        while True:
+            await asyncio.sleep(300)
+            now = time.time()
+            for feed_id in list(self._wanted):
+                expires = self._leases.get(feed_id)
+                pending = self._pending.get(feed_id)
+                if expires is not None and expires - now > self.renew_margin:
+                    continue
+                # 拒否・否認された購読はバックオフ期間が明けるまで送らない
+                if self._retry_at.get(feed_id, 0) > now:
+                    continue
+                # 確認待ちのまま10分経過した要求も再送する
+                if expires is None and pending and now - pending[1] < 600:
+                    continue
+                await self.subscribe(feed_id)
+
+    # --- HTTPハンドラ ---
+    async def _handle_verify(self, request):
+        from aiohttp import web
+
+        query = request.query
+        feed_id = query.get("feed_id", "")
+        mode = query.get("hub.mode", "")
+        pending = self._pending.get(feed_id)
+
+        if mode == "denied":
+            logger.warning("WebSub subscription for %s denied: %s", feed_id, query.get("hub.reason", ""))
+            self._pending.pop(feed_id, None)
+            if feed_id in self._wanted:
+                self._back_off(feed_id)
+            return web.Response(status=200)
+
+        if query.get("hub.topic") != self.topic_url(feed_id) or not pending or pending[0] != mode:
+            return web.Response(status=404)
+
+        self._pending.pop(feed_id, None)
+        if mode == "subscribe":
+            lease = int(query.get("hub.lease_seconds", self.lease_seconds))
+            self._leases[feed_id] = time.time() + lease
+            self._failures.pop(feed_id, None)
+            self._retry_at.pop(feed_id, None)
+        self.stats["verified"] += 1
+        return web.Response(status=200, text=query.get("hub.challenge", ""))
+
+    def _signature_valid(self, header, body):
+        if not header or "=" not in header:
+            return False
+        algorithm, _, signature = header.partition("=")
+        if algorithm.lower() not in SIGNATURE_ALGORITHMS:
+            return False
+        expected = hmac.new(self.secret, body, algorithm.lower()).hexdigest()
+        return hmac.compare_digest(expected.encode(), signature.encode())
+
+    async def _handle_notify(self, request):
+        from aiohttp import web
+
+        feed_id = request.query.get("feed_id", "")
+        body = await request.read()
+
+        # 署名不一致のメッセージは2xxを返しつつ破棄する（WebSub仕様）
+        if feed_id not in self._wanted or not self._signature_valid(request.headers.get("X-Hub-Signature"), body):
+            self.stats["rejected"] += 1
+            return web.Response(status=202)
+
+        self.stats["notifications"] += 1
+        try:
+            feed = parse_feed(body)
+        except Exception as e:
+            logger.warning(f"WebSub payload for {feed_id} could not be parsed: {e}")
+            return web.Response(status=202)
+
+        if feed.entries:
+            self._spawn(self._dispatch(feed_id, feed))
+        return web.Response(status=202)
+
+    async def _dispatch(self, feed_id, feed):
+        try:
+            await self.on_notify(feed_id, feed)
+        except Exception as e:
+            logger.error(f"WebSub dispatch failed for {feed_id}: {e}", exc_info=True)
+
+
+async def _selftest():
+    """ローカルの疑似ハブで購読確認・署名付き通知・改ざん通知・否認とバックオフを確認する"""
+    import os
+    import socket
+    from urllib.parse import urlencode
+    from aiohttp import web
+
+    from utils.http_client import HttpClient
+
+    def free_port():
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            return sock.getsockname()[1]
+
+    with open(os.path.join(os.path.dirname(__file__), "fixtures", "videos_push.xml"), "rb") as f:
+        payload = f.read()
+
+    hub_port, callback_port = free_port(), free_port()
+    client = HttpClient(retries=0)
+    verified = asyncio.Event()
+    denied = asyncio.Event()
+    notified = []
+    results = []
+
+    def check(name, ok):
+        results.append(ok)
+        print(f"{'PASS' if ok else 'FAIL'} {name}")
+
+    async def verify(form):
+        # ハブ側からコールバックへ購読確認を送る（denied 指定のフィードは否認する）
+        callback = form["hub.callback"]
+        if callback.endswith("feed_id=UCdenied"):
+            query = {"hub.mode": "denied", "hub.topic": form["hub.topic"], "hub.reason": "test"}
+            await client.get(f"{callback}&{urlencode(query)}")
+            denied.set()
+            return
+        challenge = secrets.token_hex(8)
+        query = {"hub.mode": form["hub.mode"], "hub.topic": form["hub.topic"],
+                 "hub.challenge": challenge, "hub.lease_seconds": "600"}
+        res = await client.get(f"{callback}&{urlencode(query)}")
+        check("hub.challenge echoed", res.status == 200 and res.body.decode() == challenge)
+        verified.set()
+
+    async def hub(request):
+        form = dict(await request.post())
+        asyncio.create_task(verify(form))
+        return web.Response(status=202)
+
+    app = web.Application()
+    app.router.add_post("/subscribe", hub)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", hub_port).start()
+
+    async def on_notify(feed_id, feed):
+        notified.append((feed_id, [entry.video_id for entry in feed.entries]))
+
+    subscriber = WebSubSubscriber(client, f"http://127.0.0.1:{callback_port}/websub", on_notify, secret="s3cret",
+                                  host="127.0.0.1", port=callback_port, hub_url=f"http://127.0.0.1:{hub_port}/subscribe")
+    await client.start()
+    await subscriber.start()
+    try:
+        subscriber.watch("UCfeed")
+        await asyncio.wait_for(verified.wait(), 5)
+        check("lease recorded", (subscriber.lease_remaining("UCfeed") or 0) > 500)
+
+        callback = f"http://127.0.0.1:{callback_port}/websub?feed_id=UCfeed"
+        for algorithm in ("sha1", "sha256", "md5"):
+            signature = hmac.new(b"s3cret", payload, algorithm).hexdigest()
+            await client.post(callback, data=payload, headers={"X-Hub-Signature": f"{algorithm}={signature}"})
+        await client.post(callback, data=payload, headers={"X-Hub-Signature": "sha1=" + "0" * 40})
+        await client.post(callback, data=payload)
+        await asyncio.sleep(0.1)
+        check("signed sha1/sha256 notifications delivered", len(notified) == 2 and notified[0][0] == "UCfeed")
+        check("md5, forged and unsigned notifications rejected", subscriber.stats["rejected"] == 3)
+
+        subscriber.watch("UCdenied")
+        await asyncio.wait_for(denied.wait(), 5)
+        await asyncio.sleep(0.1)
+        check("denied subscription backs off", subscriber._retry_at.get("UCdenied", 0) > time.time() + 500)
+    finally:
+        await subscriber.stop()
+        await runner.cleanup()
+        await client.close()
+    return all(results)
+
+
+if __name__ == "__main__":
+    import sys
+
+    sys.exit(0 if asyncio.run(_selftest()) else 1)
@@ -0,0 +1,135 @@
+"""YouTube Atomフィード専用の軽量ストリーミングパーサ
+
+feedparser の代わりに xml.etree の XMLPullParser で必要なフィールドだけを
+逐次抽出し、max_entries 件に達した時点で読み込みを打ち切る。
+
+    python -m utils.yt_feed [feed1.xml feed2.xml ...]
+
+で記録済みフィードに対する feedparser との比較ベンチマークを実行できる
+（引数なしの場合は utils/fixtures/ の同梱フィードを使う）。
+"""
+import os
+import xml.etree.ElementTree as ET
+
+ATOM = "{http://www.w3.org/2005/Atom}"
+YT = "{http://www.youtube.com/xml/schemas/2015}"
+MEDIA = "{http://search.yahoo.com/mrss/}"
+
+_CHUNK_SIZE = 16 * 1024
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+class FeedEntry:
+    __slots__ = ("video_id", "title", "link", "author", "author_url", "summary", "published")
+
+    def __init__(self):
+        self.video_id = ""
+        self.title = ""
+        self.link = ""
+        self.author = ""
+        self.author_url = ""
+        self.summary = ""
+        self.published = ""
+
+    def __repr__(self):
+        return f"<FeedEntry {self.video_id} {self.title!r}>"
+
+
+class Feed:
+    __slots__ = ("channel_id", "title", "entries")
+
+    def __init__(self, channel_id="", title="", entries=None):
+        self.channel_id = channel_id
+        self.title = title
+        self.entries = entries if entries is not None else []
+
+
+def parse_feed(data, max_entries=15):
+    """YouTubeのRSS (Atom) を解析し、先頭 max_entries 件の Feed を返す"""
+    feed = Feed()
+    parser = ET.XMLPullParser(events=("start", "end"))
+    depth = 0
+    entry = None
+    in_author = False
+
+    for offset in range(0, len(data), _CHUNK_SIZE):
+        parser.feed(data[offset:offset + _CHUNK_SIZE])
+        for event, elem in parser.read_events():
+            tag = elem.tag
+            if event == "start":
+                depth += 1
+                if tag == ATOM + "entry":
+                    entry = FeedEntry()
+                elif tag == ATOM + "author" and entry is not None:
+                    in_author = True
+                continue
+
+            depth -= 1
+            if entry is None:
+                # フィード直下（チャンネル情報）
+                if depth == 1:
+                    if tag == ATOM + "title":
+                        feed.title = elem.text or ""
+                    elif tag == YT + "channelId":
+                        feed.channel_id = elem.text or ""
+                continue
+
+            if tag == ATOM + "author":
+                in_author = False
+            elif in_author:
+                if tag == ATOM + "name":
+                    entry.author = elem.text or ""
+                elif tag == ATOM + "uri":
+                    entry.author_url = elem.text or ""
+            elif tag == YT + "videoId":
+                entry.video_id = elem.text or ""
+            elif tag == ATOM + "title" and depth == 2:
+                entry.title = elem.text or ""
+            elif tag == ATOM + "link" and elem.get("rel", "alternate") == "alternate":
+                entry.link = elem.get("href", "")
+            elif tag == ATOM + "published":
+                entry.published = elem.text or ""
+            elif tag == MEDIA + "description":
+                entry.summary = elem.text or ""
+            elif tag == ATOM + "entry":
+                feed.entries.append(entry)
+                entry = None
+                elem.clear()
+                if len(feed.entries) >= max_entries:
+                    return feed
+
+    return feed
+
+
+def _benchmark(paths, rounds=200):
+    import time
+
+    try:
+        import feedparser
+    except ImportError:
+        feedparser = None
+
+    for path in paths:
+        with open(path, "rb") as f:
+            data = f.read()
+
+        start = time.perf_counter()
+        for _ in range(rounds):
+            parse_feed(data)
+        ours = (time.perf_counter() - start) / rounds * 1000
+        line = f"{path}: yt_feed {ours:.3f} ms"
+
+        if feedparser is not None:
+            start = time.perf_counter()
+            for _ in range(rounds):
+                feedparser.parse(data)
+            theirs = (time.perf_counter() - start) / rounds * 1000
+            line += f" / feedparser {theirs:.3f} ms ({theirs / ours:.1f}x)"
+        print(line)
+
+
+if __name__ == "__main__":
+    import sys
+
+    _benchmark(sys.argv[1:] or sorted(
+        os.path.join(FIXTURE_DIR, name) for name in os.listdir(FIXTURE_DIR) if name.endswith(".xml")))